@@ -1,10 +1,10 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 import os
-from dotenv import load_dotenv
 
 
+#.env читает только pydantic-settings (env_file), переменные окружения процесса главнее
 dotenv_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".env")
-load_dotenv(dotenv_path)
 
 #Класс хранилище переменных для подключения к базе данных
 #Class storing variables for connecting to a database
@@ -14,6 +14,70 @@ class Settings(BaseSettings):
     DB_NAME: str
     DB_USER: str
     DB_PASS: str
+    #Логировать каждый SQL-запрос (синхронно в stdout, только для отладки)
+    DB_ECHO: bool = False
+    #Пул соединений: постоянные соединения, сверх них, ожидание свободного (с), пересоздание (с)
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = False
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    #Сколько соединений пула открыть при старте процесса (не больше DB_POOL_SIZE, 0 - не прогревать)
+    #и подготовить ли на них частые запросы чтения
+    DB_POOL_WARMUP: int = 2
+    DB_PREPARE_STATEMENTS: bool = True
+    #Сколько ждать ответа базы в /health/ready (с)
+    HEALTH_DB_TIMEOUT: float = 2.0
+    #Реплики для чтения: URL через запятую (postgresql+asyncpg://...), пусто - все в primary.
+    #Допустимая задержка реплики (с), интервал проверки реплик (с) и сколько секунд после записи
+    #чтения клиента идут в primary
+    DB_REPLICA_URLS: str = ""
+    DB_REPLICA_MAX_LAG: float = 5.0
+    DB_REPLICA_CHECK_INTERVAL: float = 2.0
+    DB_READ_STICKY_SECONDS: float = 5.0
+    #Production-запуск (python -m app.server): адрес, порт и число процессов (0 - по числу ядер)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int = 0
+    #Допустимое время показаний телеметрии: не старше READINGS_RETENTION_DAYS дней
+    #и не дальше READINGS_MAX_FUTURE_HOURS часов вперед (секции создаются только для этого окна)
+    READINGS_RETENTION_DAYS: int = 365
+    READINGS_MAX_FUTURE_HOURS: float = 24.0
+    #Подсчет SQL-запросов на HTTP-запрос: бюджет запросов, порог повторов одного запроса (N+1)
+    #и строгий режим, в котором нарушение превращает ответ в 500
+    SQL_COUNTER_ENABLED: bool = True
+    SQL_QUERY_BUDGET: int = 20
+    SQL_REPEAT_THRESHOLD: int = 5
+    SQL_STRICT_MODE: bool = False
+    #Время жизни кэша статистики по батареям в секундах (0 - без кэша)
+    STATS_CACHE_TTL: float = 10.0
+    #Кэш ответов на чтение устройства/батареи по id: количество записей и время жизни в секундах
+    RESPONSE_CACHE_SIZE: int = 1024
+    RESPONSE_CACHE_TTL: float = 30.0
+    #Сверять ETag записи из кэша с базой перед ответом (нужно, когда процессов несколько:
+    #сброс кэша при изменении виден только процессу, который выполнил изменение)
+    RESPONSE_CACHE_VALIDATE: bool = False
+    #Отдавать ответы чтения из строк базы сразу в JSON (pydantic-core), без повторной валидации схемой
+    FAST_JSON_RESPONSES: bool = False
+    #Поток алертов (LISTEN/NOTIFY): включен ли, размер очереди подписчика,
+    #интервал heartbeat и проверки LISTEN-соединения (с), пауза перед переподключением (с)
+    ALERT_STREAM_ENABLED: bool = True
+    ALERT_QUEUE_SIZE: int = 100
+    ALERT_HEARTBEAT: float = 15.0
+    ALERT_RECONNECT_DELAY: float = 5.0
+    #Как часто сверять алерты в памяти с базой (с)
+    ALERT_RECONCILE_INTERVAL: float = 300.0
+    #Сжатие ответов по Accept-Encoding: кодеки в порядке предпочтения (br и zstd - если установлены
+    #brotli и zstandard), минимальный размер тела в байтах и профиль уровня (off, fast, balanced, max)
+    #для обычных ответов и для потоковых выгрузок /export. Куски от COMPRESSION_THREAD_SIZE байт
+    #сжимаются в пуле потоков, а не в event loop
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_ENCODINGS: str = "zstd,br,gzip"
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_THREAD_SIZE: int = 65536
+    COMPRESSION_LEVEL: Literal["off", "fast", "balanced", "max"] = "balanced"
+    COMPRESSION_EXPORT_LEVEL: Literal["off", "fast", "balanced", "max"] = "fast"
     model_config = SettingsConfigDict(
         env_file=dotenv_path
     )
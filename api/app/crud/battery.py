@@ -1,178 +1,498 @@
+from typing import AsyncIterator, Sequence
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from sqlalchemy.orm import selectinload
+from sqlalchemy import Integer, any_, bindparam, delete, select, func, insert, union, update, RowMapping
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, selectinload
 from app.models.battery import Battery
 from app.models.device import Device
-from app.schemas.battery import BatteryCreate, BatteryUpdate, BatteryPatch
+from app.schemas.battery import BatteryCreate, BatteryFilter, BatteryUpdate, BatteryPatch
+from app.crud.errors import NotFoundError, constraint_name, integrity_error_message
+from app.crud.search import name_search
+from app.crud.pagination import count_rows, fetch_page
+from app.crud.projection import fetch_rows
+from app.services.stats import stats_cache
+from app.services.cache import battery_cache, device_cache
+from app.services.etag import make_etag, versions_digest
+
+#Ограничение по тз: не больше 5 батарей на устройство
+MAX_BATTERIES_PER_DEVICE = 5
+
+#Пороги алертов: низкая емкость и необходимость замены
+LOW_CAPACITY_THRESHOLD = 20.0
+REPLACEMENT_CAPACITY_THRESHOLD = 10.0
+REPLACEMENT_SERVICE_LIFE_DAYS = 30
+
+
+def need_replacement_clause():
+    """Условие "батарея требует замены" для WHERE/FILTER"""
+    return (Battery.residual_capacity < REPLACEMENT_CAPACITY_THRESHOLD) | (Battery.service_life < REPLACEMENT_SERVICE_LIFE_DAYS)
+
+
+def in_alert(alert: str, row) -> bool:
+    """Выполняется ли условие алерта для прочитанной строки батареи (те же пороги, что в SQL)"""
+    if alert == "low_capacity":
+        return row["residual_capacity"] < LOW_CAPACITY_THRESHOLD
+    return row["residual_capacity"] < REPLACEMENT_CAPACITY_THRESHOLD or row["service_life"] < REPLACEMENT_SERVICE_LIFE_DAYS
+
+
+def need_replacement_ids():
+    """
+    Id батарей, требующих замены, через UNION двух диапазонов.
+    В отличие от OR в WHERE каждая ветка идет по своему индексу (residual_capacity_id, service_life_id)
+    """
+    return union(
+        select(Battery.id).where(Battery.residual_capacity < REPLACEMENT_CAPACITY_THRESHOLD),
+        select(Battery.id).where(Battery.service_life < REPLACEMENT_SERVICE_LIFE_DAYS),
+    )
+
 
 class BatteryCRUD:
+    #Колонки, по которым разрешены сортировка и keyset-пагинация
+    SORTABLE_COLUMNS = {
+        "id": Battery.id,
+        "name": Battery.name,
+        "nominal_voltage": Battery.nominal_voltage,
+        "residual_capacity": Battery.residual_capacity,
+        "service_life": Battery.service_life,
+        "device_id": Battery.device_id,
+    }
+
+    #Колонки схемы ответа Battery: списки читаются только ими, без ORM-объектов
+    READ_COLUMNS = (
+        Battery.id,
+        Battery.name,
+        Battery.nominal_voltage,
+        Battery.residual_capacity,
+        Battery.service_life,
+        Battery.device_id,
+    )
+
+    #Колонки, которые попадают в выгрузку /export
+    EXPORT_COLUMNS = (
+        Battery.id,
+        Battery.name,
+        Battery.nominal_voltage,
+        Battery.residual_capacity,
+        Battery.service_life,
+        Battery.device_id,
+    )
+
     def __init__(self, session: AsyncSession):
         self.session = session
+
+    @staticmethod
+    def filter_clauses(filters: BatteryFilter | None) -> list:
+        """WHERE-условия по фильтрам списка (под каждое есть индекс)"""
+        if filters is None:
+            return []
+        clauses = []
+        if filters.device_id is not None:
+            clauses.append(Battery.device_id == filters.device_id)
+        if filters.nominal_voltage is not None:
+            clauses.append(Battery.nominal_voltage == filters.nominal_voltage)
+        if filters.min_capacity is not None:
+            clauses.append(Battery.residual_capacity >= filters.min_capacity)
+        if filters.max_capacity is not None:
+            clauses.append(Battery.residual_capacity <= filters.max_capacity)
+        if filters.min_service_life is not None:
+            clauses.append(Battery.service_life >= filters.min_service_life)
+        if filters.max_service_life is not None:
+            clauses.append(Battery.service_life <= filters.max_service_life)
+        return clauses
     
     async def create(self, battery: BatteryCreate) -> Battery:
-        # Проверяем, что устройство существует
-        device = await self.session.get(Device, battery.device_id)
-        if not device:
-            raise ValueError(f"Device with id {battery.device_id} not found")
-        
-        # Проверяем, что у устройства меньше 5 батарей
-        batteries_count = await self.count_by_device(battery.device_id)
-        if batteries_count >= 5:
-            raise ValueError("Device cannot have more than 5 batteries")
-        
-        db_battery = Battery(**battery.model_dump())
-        self.session.add(db_battery)
-        await self.session.commit()
-        await self.session.refresh(db_battery)
+        """
+        Создать батарею одним INSERT ... RETURNING.
+        Существование устройства проверяет внешний ключ, лимит в 5 батарей -
+        CHECK на devices.battery_count, который ведет триггер
+        """
+        try:
+            result = await self.session.execute(insert(Battery).values(**battery.model_dump()).returning(Battery))
+            db_battery = result.scalar_one()
+            await self.session.commit()
+        except IntegrityError as e:
+            await self.session.rollback()
+            raise self._write_error(e, battery.device_id, "Device cannot have more than 5 batteries")
+        stats_cache.invalidate()
+        device_cache.invalidate(db_battery.device_id)
         return db_battery
+
+    @staticmethod
+    def _write_error(error: IntegrityError, device_id: int | None, limit_message: str) -> ValueError:
+        """Исключение для нарушенного при записи батареи ограничения"""
+        name = constraint_name(error)
+        if name == "batteries_device_id_fkey":
+            return NotFoundError(f"Device with id {device_id} not found")
+        if name == "ck_devices_battery_count":
+            return ValueError(limit_message)
+        return ValueError(integrity_error_message(error, device_id=device_id))
     
+    async def bulk_create(self, items: list[BatteryCreate], partial: bool = False) -> tuple[list[int], list[dict]]:
+        """
+        Массовое создание батарей в одной транзакции.
+        Существование устройств, лимит в 5 батарей и уникальность имен
+        проверяются для всей пачки несколькими групповыми запросами.
+        Возвращает id созданных батарей и ошибки по элементам
+        """
+        device_ids = {item.device_id for item in items}
+        names = {item.name for item in items}
+
+        # Одним запросом: какие устройства существуют и сколько у них батарей
+        result = await self.session.execute(
+            select(Device.id, Device.battery_count).where(Device.id.in_(list(device_ids)))
+        )
+        device_counts = dict(result.all())
+
+        result = await self.session.execute(select(Battery.name).where(Battery.name.in_(list(names))))
+        taken_names = set(result.scalars().all())
+
+        rows, errors = [], []
+        for index, item in enumerate(items):
+            if item.name in taken_names:
+                detail = "Battery with this name already exists"
+            elif item.device_id not in device_counts:
+                detail = f"Device with id {item.device_id} not found"
+            elif device_counts[item.device_id] >= MAX_BATTERIES_PER_DEVICE:
+                detail = "Device cannot have more than 5 batteries"
+            else:
+                detail = None
+
+            if detail:
+                errors.append({"index": index, "name": item.name, "detail": detail})
+                continue
+            taken_names.add(item.name)
+            device_counts[item.device_id] += 1
+            rows.append(item.model_dump())
+
+        if not rows or (errors and not partial):
+            return [], errors
+
+        # insertmanyvalues: пачки многострочных INSERT ... RETURNING вместо запроса на строку
+        try:
+            result = await self.session.execute(
+                insert(Battery).returning(Battery.id, sort_by_parameter_order=True),
+                rows
+            )
+            ids = list(result.scalars().all())
+            await self.session.commit()
+        except IntegrityError:
+            #Между проверкой и вставкой устройство заняли параллельно: CHECK на battery_count не пропустил пачку
+            await self.session.rollback()
+            raise ValueError("Batch conflicts with concurrent changes, retry the request")
+        stats_cache.invalidate()
+        device_cache.invalidate(*{row["device_id"] for row in rows})
+        return ids, errors
+
+    @classmethod
+    def columns(cls, fields: tuple[str, ...] | None = None) -> list:
+        """Колонки READ_COLUMNS, оставшиеся после ?fields= (None - все)"""
+        return [column for column in cls.READ_COLUMNS if fields is None or column.key in fields]
+
+    async def get_row(self, battery_id: int, fields: tuple[str, ...]) -> RowMapping | None:
+        """Выбранные колонки одной батареи и ее версия (для ETag), без ORM-объекта"""
+        rows = await fetch_rows(self.session, select(*self.columns(fields), Battery.version).where(Battery.id == battery_id))
+        return rows[0] if rows else None
+
     async def get(self, battery_id: int) -> Battery | None:
         result = await self.session.execute(select(Battery).where(Battery.id == battery_id).options(selectinload(Battery.device)))
         return result.scalar_one_or_none()
     
+    async def get_many(self, ids: list[int]) -> dict[int, RowMapping]:
+        """Получить строки батарей по списку id одним запросом WHERE id = ANY(:ids)"""
+        rows = await fetch_rows(
+            self.session,
+            select(*self.READ_COLUMNS).where(Battery.id == any_(bindparam("ids", sorted(set(ids)), type_=ARRAY(Integer))))
+        )
+        return {row["id"]: row for row in rows}
+    
+    async def search(self, q: str, limit: int = 20) -> Sequence[RowMapping]:
+        """Найти батареи по части имени, лучшие совпадения первыми"""
+        return await fetch_rows(self.session, name_search(select(*self.READ_COLUMNS), Battery.name, q, limit))
+    
     async def get_all(self) -> list[Battery]:
-        #selectinload - позволяет заранее подгрузить все батареи для устройств одним дополнительным запросом
-        #также делает 1 дополнительный запрос для всех связанных батарей вместо возможных N+1 запросах
-        result = await self.session.execute(select(Battery).options(selectinload(Battery.device)))
+        #Схема Battery не содержит устройство, поэтому связь не загружается
+        result = await self.session.execute(select(Battery))
         return result.scalars().all()
+
+    async def get_page(
+        self,
+        limit: int,
+        skip: int = 0,
+        cursor: str | None = None,
+        sort_by: str = "id",
+        order: str = "asc",
+        filters: BatteryFilter | None = None,
+        fields: tuple[str, ...] | None = None,
+    ) -> tuple[list[RowMapping], str | None, tuple]:
+        """
+        Получить страницу батарей: по курсору (keyset) или по skip/limit.
+        fields - читать только эти колонки (?fields=).
+        Третье значение - версии страницы для list_etag, тем же запросом
+        """
+        stmt = select(*self.columns(fields), Battery.version).where(*self.filter_clauses(filters))
+        rows, next_cursor = await fetch_page(self.session, stmt, self.SORTABLE_COLUMNS, limit, skip, cursor, sort_by, order)
+        return rows, next_cursor, self.page_versions(rows, next_cursor)
+
+    async def count(self, mode: str = "exact", filters: BatteryFilter | None = None) -> int | None:
+        """Посчитать батареи точно, оценкой планировщика или не считать"""
+        return await count_rows(self.session, select(Battery.id).where(*self.filter_clauses(filters)), mode)
     
-    async def get_by_device(self, device_id: int) -> list[Battery]:
+    @staticmethod
+    def etag_for(battery: Battery) -> str:
+        """ETag загруженной батареи"""
+        return make_etag("battery", battery.version)
+
+    async def get_etag(self, battery_id: int) -> str | None:
+        """ETag батареи одним запросом по первичному ключу. None - батареи нет"""
+        result = await self.session.execute(select(Battery.version).where(Battery.id == battery_id))
+        version = result.scalar_one_or_none()
+        if version is None:
+            return None
+        return make_etag("battery", version)
+
+    @staticmethod
+    def page_versions(rows: Sequence[RowMapping], next_cursor: str | None) -> tuple:
+        """Свертка версий строк страницы и признак следующей страницы"""
+        return (*versions_digest(row["version"] for row in rows), next_cursor is not None)
+
+    @staticmethod
+    def list_etag(versions: tuple, total: int | None) -> str:
+        """ETag страницы списка по ее версиям и total"""
+        return make_etag("batteries", *versions, total)
+
+    async def page_etag(
+        self,
+        limit: int,
+        skip: int = 0,
+        cursor: str | None = None,
+        sort_by: str = "id",
+        order: str = "asc",
+        total: int | None = None,
+        filters: BatteryFilter | None = None,
+    ) -> str:
+        """
+        ETag страницы до ее загрузки, для условного запроса.
+        Читает только id/version строк страницы, без ORM-объектов и pydantic
+        """
+        stmt = select(Battery.id, Battery.version).where(*self.filter_clauses(filters))
+        rows, next_cursor = await fetch_page(self.session, stmt, self.SORTABLE_COLUMNS, limit, skip, cursor, sort_by, order)
+        return self.list_etag(self.page_versions(rows, next_cursor), total)
+
+    async def stream_export(self, chunk_size: int = 1000, filters: BatteryFilter | None = None) -> AsyncIterator[Sequence[RowMapping]]:
+        """
+        Потоково читать батареи пачками по chunk_size строк.
+        yield_per включает серверный курсор, поэтому таблица не грузится в память целиком
+        """
+        stmt = select(*self.EXPORT_COLUMNS).where(*self.filter_clauses(filters)).order_by(Battery.id).execution_options(yield_per=chunk_size)
+        result = await self.session.stream(stmt)
+        async for partition in result.mappings().partitions(chunk_size):
+            yield partition
+    
+    async def get_by_device(self, device_id: int) -> Sequence[RowMapping]:
         """Получить все батареи устройства"""
-        result = await self.session.execute(
-            select(Battery).where(Battery.device_id == device_id).options(selectinload(Battery.device))
+        return await fetch_rows(
+            self.session,
+            select(*self.READ_COLUMNS).where(Battery.device_id == device_id).order_by(Battery.id)
         )
-        return result.scalars().all()
     
-    async def update(self, battery_id: int, battery_update: BatteryUpdate) -> Battery | None:
-        battery = await self.get(battery_id)
-        if battery:
-            # Если меняется device_id, проверяем новое устройство
-            if battery_update.device_id != battery.device_id:
-                device = await self.session.get(Device, battery_update.device_id)
-                if not device:
-                    raise ValueError(f"Device with id {battery_update.device_id} not found")
-                
-                # Проверяем, что у нового устройства меньше 5 батарей
-                batteries_count = await self.count_by_device(battery_update.device_id)
-                if batteries_count >= 5:
-                    raise ValueError("New device cannot have more than 5 batteries")
-            
-            update_data = battery_update.model_dump(exclude_unset=True)
-            for field, value in update_data.items():
-                setattr(battery, field, value)
-            
+    async def _update_returning(self, battery_id: int, data: dict, limit_message: str) -> Battery | None:
+        """
+        UPDATE ... FROM ... RETURNING одним запросом: новая строка и прежний device_id.
+        Лимит батарей, уникальность имени и существование устройства проверяют ограничения базы
+        """
+        old = aliased(Battery)
+        try:
+            result = await self.session.execute(
+                update(Battery)
+                .where(Battery.id == battery_id, old.id == Battery.id)
+                .values(**data)
+                .returning(Battery, old.device_id)
+                .execution_options(synchronize_session=False)
+            )
+            row = result.one_or_none()
+            if row is None:
+                await self.session.rollback()
+                return None
             await self.session.commit()
-            await self.session.refresh(battery)
+        except IntegrityError as e:
+            await self.session.rollback()
+            raise self._write_error(e, data.get("device_id"), limit_message)
+
+        battery, old_device_id = row
+        stats_cache.invalidate()
+        battery_cache.invalidate(battery_id)
+        device_cache.invalidate(old_device_id, battery.device_id)
         return battery
+
+    async def update(self, battery_id: int, battery_update: BatteryUpdate) -> Battery | None:
+        update_data = battery_update.model_dump(exclude_unset=True)
+        return await self._update_returning(battery_id, update_data, "New device cannot have more than 5 batteries")
     
     async def patch(self, battery_id: int, battery_patch: BatteryPatch) -> Battery | None:
         """Частичное обновление батареи"""
-        battery = await self.get(battery_id)
-        if battery:
-            update_data = battery_patch.model_dump(exclude_unset=True, exclude_none=True)
-            
-            if not update_data:
-                raise ValueError("No fields to update")
-            
-            # Если меняется device_id, проверяем новое устройство
-            if 'device_id' in update_data and update_data['device_id'] != battery.device_id:
-                new_device_id = update_data['device_id']
-                device = await self.session.get(Device, new_device_id)
-                if not device:
-                    raise ValueError(f"Device with id {new_device_id} not found")
-                
-                # Проверяем, что у нового устройства меньше 5 батарей
-                batteries_count = await self.count_by_device(new_device_id)
-                if batteries_count >= 5:
-                    raise ValueError("New device cannot have more than 5 batteries")
-            
-            for field, value in update_data.items():
-                setattr(battery, field, value)
-            
-            await self.session.commit()
-            await self.session.refresh(battery)
-        return battery
+        update_data = battery_patch.model_dump(exclude_unset=True, exclude_none=True)
+        if not update_data:
+            raise ValueError("No fields to update")
+        return await self._update_returning(battery_id, update_data, "New device cannot have more than 5 batteries")
     
-    async def delete(self, battery_id: int) -> bool:
-        battery = await self.session.get(Battery, battery_id)
-        if battery:
-            await self.session.delete(battery)
-            await self.session.commit()
-            return True
-        return False
+    async def delete(self, battery_id: int, device_id: int | None = None) -> bool:
+        """Удалить батарею (если передан device_id - только батарею этого устройства)"""
+        stmt = delete(Battery).where(Battery.id == battery_id).returning(Battery.device_id)
+        if device_id is not None:
+            stmt = stmt.where(Battery.device_id == device_id)
+        result = await self.session.execute(stmt)
+        deleted = result.one_or_none()
+        if deleted is None:
+            return False
+        await self.session.commit()
+        stats_cache.invalidate()
+        battery_cache.invalidate(battery_id)
+        device_cache.invalidate(deleted.device_id)
+        return True
     
     async def count_by_device(self, device_id: int) -> int:
-        """Посчитать количество батарей у устройства"""
+        """Посчитать количество батарей у устройства (по счетчику devices.battery_count)"""
         result = await self.session.execute(
-            select(func.count(Battery.id)).where(Battery.device_id == device_id)
+            select(Device.battery_count).where(Device.id == device_id)
         )
         return result.scalar() or 0
     
-    async def get_low_capacity_batteries(self, threshold: float = 20.0) -> list[Battery]:
-        """Получить батареи с низкой емкостью"""
-        result = await self.session.execute(
-            select(Battery).where(Battery.residual_capacity < threshold).options(selectinload(Battery.device))
+    async def get_low_capacity_batteries(self, threshold: float = LOW_CAPACITY_THRESHOLD, limit: int = 100) -> Sequence[RowMapping]:
+        """Получить батареи с низкой емкостью (по индексу residual_capacity_id)"""
+        return await fetch_rows(
+            self.session,
+            select(*self.READ_COLUMNS).where(Battery.residual_capacity < threshold).order_by(Battery.id).limit(limit)
         )
-        return result.scalars().all()
     
-    async def get_need_replacement_batteries(self) -> list[Battery]:
+    async def get_need_replacement_batteries(self, limit: int = 100) -> Sequence[RowMapping]:
         """Получить батареи, требующие замены (емкость < 10% или срок службы < 30 дней)"""
-        result = await self.session.execute(
-            select(Battery).where(
-                (Battery.residual_capacity < 10) | (Battery.service_life < 30)
-            )
+        return await fetch_rows(
+            self.session,
+            select(*self.READ_COLUMNS).where(Battery.id.in_(need_replacement_ids())).order_by(Battery.id).limit(limit)
         )
-        return result.scalars().all()
+    
+    async def get_alert_member_ids(self) -> dict[str, set[int]]:
+        """
+        Id всех батарей в каждом алерте, для сверки множеств в памяти.
+        Читает только индексы по емкости и сроку службы, без прохода по всей таблице
+        """
+        low = await self.session.execute(select(Battery.id).where(Battery.residual_capacity < LOW_CAPACITY_THRESHOLD))
+        replacement = await self.session.execute(need_replacement_ids())
+        return {
+            "low_capacity": set(low.scalars().all()),
+            "need_replacement": set(replacement.scalars().all()),
+        }
     
     async def reassign_battery(self, battery_id: int, new_device_id: int) -> Battery | None:
         """Переподключить батарею к другому устройству"""
-        battery = await self.get(battery_id)
-        if not battery:
-            return None
-        
-        # Проверяем новое устройство
-        device = await self.session.get(Device, new_device_id)
-        if not device:
-            raise ValueError(f"Device with id {new_device_id} not found")
-        
-        # Проверяем лимит батарей у нового устройства
-        batteries_count = await self.count_by_device(new_device_id)
-        if batteries_count >= 5:
-            raise ValueError("New device cannot have more than 5 batteries")
-        
-        # Обновляем device_id
-        battery.device_id = new_device_id
-        await self.session.commit()
-        await self.session.refresh(battery)
-        return battery
+        #Кэш старого и нового устройства сбрасывается в _update_returning
+        return await self._update_returning(battery_id, {"device_id": new_device_id}, "New device cannot have more than 5 batteries")
     
-    async def get_battery_stats(self) -> dict:
-        """Получить статистику по батареям"""
-        # Общее количество
-        total_result = await self.session.execute(select(func.count(Battery.id)))
-        total = total_result.scalar()
-        
-        # Средняя емкость
-        avg_capacity_result = await self.session.execute(select(func.avg(Battery.residual_capacity)))
-        avg_capacity = round(avg_capacity_result.scalar() or 0, 2)
-        
-        # Количество с низкой емкостью
-        low_capacity_result = await self.session.execute(
-            select(func.count(Battery.id)).where(Battery.residual_capacity < 20)
+    async def reassign_many(
+        self,
+        moves: list[tuple[int, int]] | None = None,
+        from_device_id: int | None = None,
+        to_device_id: int | None = None,
+        partial: bool = False,
+    ) -> tuple[list[int], list[dict]]:
+        """
+        Массовое переподключение батарей в одной транзакции.
+        Батареи и устройства блокируются двумя групповыми запросами (FOR UPDATE,
+        в порядке id), лимит в 5 батарей считается по battery_count, переносы
+        применяются одним UPDATE ... FROM unnest. Возвращает id перенесенных
+        батарей и отклоненные пары. Батарея, уже подключенная к целевому устройству,
+        считается перенесенной (как и в reassign_battery), но не обновляется
+        """
+        by_device = from_device_id is not None
+        battery_ids = sorted({battery_id for battery_id, _ in moves}) if not by_device else []
+
+        stmt = select(Battery.id, Battery.device_id).order_by(Battery.id).with_for_update()
+        if by_device:
+            stmt = stmt.where(Battery.device_id == from_device_id)
+        else:
+            stmt = stmt.where(Battery.id.in_(battery_ids))
+        current = dict((await self.session.execute(stmt)).all())
+        if by_device:
+            moves = [(battery_id, to_device_id) for battery_id in current]
+
+        # Одним запросом: существование и заполненность всех затронутых устройств
+        device_ids = {device_id for _, device_id in moves} | {device_id for device_id in current.values() if device_id is not None}
+        result = await self.session.execute(
+            select(Device.id, Device.battery_count)
+            .where(Device.id.in_(sorted(device_ids)))
+            .order_by(Device.id)
+            .with_for_update()
         )
-        low_capacity = low_capacity_result.scalar()
-        
-        # Количество требующих замены
-        need_replacement_result = await self.session.execute(
-            select(func.count(Battery.id)).where(
-                (Battery.residual_capacity < 10) | (Battery.service_life < 30)
+        counts = dict(result.all())
+
+        planned, kept, errors, seen = {}, [], [], set()
+        for battery_id, device_id in moves:
+            if battery_id in seen:
+                detail = "Battery is listed more than once"
+            elif battery_id not in current:
+                detail = "Battery not found"
+            elif device_id not in counts:
+                detail = f"Device with id {device_id} not found"
+            elif current[battery_id] == device_id:
+                detail = None
+                kept.append(battery_id)
+            elif counts[device_id] >= MAX_BATTERIES_PER_DEVICE:
+                detail = "Device cannot have more than 5 batteries"
+            else:
+                detail = None
+                counts[device_id] += 1
+                if current[battery_id] in counts:
+                    counts[current[battery_id]] -= 1
+                planned[battery_id] = device_id
+            seen.add(battery_id)
+            if detail:
+                errors.append({"battery_id": battery_id, "device_id": device_id, "detail": detail})
+
+        if errors and not partial:
+            await self.session.rollback()
+            return [], errors
+        if not planned:
+            await self.session.rollback()
+            return kept, errors
+
+        values = func.unnest(
+            bindparam("ids", list(planned), type_=ARRAY(Integer)),
+            bindparam("device_ids", list(planned.values()), type_=ARRAY(Integer)),
+        ).table_valued("id", "device_id").render_derived(name="v")
+        try:
+            await self.session.execute(
+                update(Battery)
+                .where(Battery.id == values.c.id)
+                .values(device_id=values.c.device_id)
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+        except IntegrityError:
+            await self.session.rollback()
+            raise ValueError("Batch conflicts with concurrent changes, retry the request")
+
+        stats_cache.invalidate()
+        battery_cache.invalidate(*planned)
+        device_cache.invalidate(*planned.values(), *(current[battery_id] for battery_id in planned))
+        return [*planned, *kept], errors
+
+    async def get_battery_stats(self) -> dict:
+        """Получить статистику по батареям одним проходом по таблице"""
+        result = await self.session.execute(
+            select(
+                func.count(Battery.id),
+                func.avg(Battery.residual_capacity),
+                func.count(Battery.id).filter(Battery.residual_capacity < LOW_CAPACITY_THRESHOLD),
+                func.count(Battery.id).filter(need_replacement_clause()),
             )
         )
-        need_replacement = need_replacement_result.scalar()
-        
+        total, avg_capacity, low_capacity, need_replacement = result.one()
+
         return {
             "total_batteries": total,
-            "average_capacity": avg_capacity,
+            "average_capacity": round(avg_capacity or 0, 2),
             "low_capacity_count": low_capacity,
             "need_replacement_count": need_replacement
-        }
\ No newline at end of file
+        }
@@ -1,84 +1,332 @@
+from typing import AsyncIterator, Sequence
+
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import Integer, any_, bindparam, delete, insert, select, func, update, RowMapping
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models.battery import Battery
 from app.models.device import Device
-from app.schemas.device import DeviceCreate, DevicePatch, DeviceUpdate, DeviceList
+from app.schemas.device import DeviceCreate, DeviceFilter, DevicePatch, DeviceUpdate, DeviceList
+from app.crud.errors import integrity_error_message
+from app.crud.search import name_search
+from app.crud.pagination import count_rows, fetch_page
+from app.crud.projection import attach_children, fetch_rows
+from app.services.stats import stats_cache
+from app.services.cache import battery_cache, device_cache
+from app.services.etag import make_etag, versions_digest
 
 class DeviceCRUD:
+    #Колонки, по которым разрешены сортировка и keyset-пагинация
+    SORTABLE_COLUMNS = {
+        "id": Device.id,
+        "name": Device.name,
+        "firmware_version": Device.firmware_version,
+        "battery_count": Device.battery_count,
+    }
+
+    #Колонки схемы ответа Device (батареи добавляются отдельным запросом)
+    READ_COLUMNS = (
+        Device.id,
+        Device.name,
+        Device.firmware_version,
+        Device.is_active,
+    )
+
+    #Колонки схемы ответа Battery внутри устройства
+    BATTERY_COLUMNS = (
+        Battery.id,
+        Battery.name,
+        Battery.nominal_voltage,
+        Battery.residual_capacity,
+        Battery.service_life,
+        Battery.device_id,
+    )
+
+    #Колонки сводки (?view=summary): емкость батарей считается GROUP BY, сами батареи не читаются
+    SUMMARY_COLUMNS = (
+        Device.id,
+        Device.name,
+        Device.firmware_version,
+        Device.is_active,
+        Device.battery_count,
+        func.min(Battery.residual_capacity).label("min_capacity"),
+        func.avg(Battery.residual_capacity).label("avg_capacity"),
+    )
+    SUMMARY_AGGREGATES = ("min_capacity", "avg_capacity")
+
+    #Колонки, которые попадают в выгрузку /export
+    EXPORT_COLUMNS = (
+        Device.id,
+        Device.name,
+        Device.firmware_version,
+        Device.is_active,
+    )
+
     def __init__(self, session: AsyncSession):
         self.session=session
+
+    @staticmethod
+    def filter_clauses(filters: DeviceFilter | None) -> list:
+        """WHERE-условия по фильтрам списка"""
+        if filters is None:
+            return []
+        clauses = []
+        if filters.is_active is not None:
+            clauses.append(Device.is_active.is_(filters.is_active))
+        if filters.firmware_version is not None:
+            clauses.append(Device.firmware_version == filters.firmware_version)
+        #Число батарей берется из счетчика, без подзапроса к batteries
+        if filters.min_batteries is not None:
+            clauses.append(Device.battery_count >= filters.min_batteries)
+        if filters.max_batteries is not None:
+            clauses.append(Device.battery_count <= filters.max_batteries)
+        return clauses
     
     async def create(self, device: DeviceCreate) -> Device:
-        db_device =  Device(**device.model_dump())
-        self.session.add(db_device)
-        await self.session.commit()
-        await self.session.refresh(db_device)
-
-        # Предзагрузка батарей
-        result = await self.session.execute(
-            select(Device)
-            .options(selectinload(Device.batteries))
-            .where(Device.id == db_device.id)
-        )
-        db_device = result.scalar_one()
-
+        """Создать устройство одним INSERT ... RETURNING, уникальность имени проверяет база"""
+        try:
+            result = await self.session.execute(insert(Device).values(**device.model_dump()).returning(Device))
+            db_device = result.scalar_one()
+            await self.session.commit()
+        except IntegrityError as e:
+            await self.session.rollback()
+            raise ValueError(integrity_error_message(e))
+        #У нового устройства батарей нет, загружать их не нужно
+        set_committed_value(db_device, "batteries", [])
         return db_device
     
     async def get(self, device_id: int) -> Device | None:
-        result = await self.session.execute(select(Device).where(Device.id==device_id).options(selectinload(Device.batteries)))
-        return result.scalar_one_or_none()
+        #joinedload - устройство и его батареи (не больше 5) одним запросом
+        result = await self.session.execute(select(Device).where(Device.id==device_id).options(joinedload(Device.batteries)))
+        return result.unique().scalar_one_or_none()
+    
+    async def _with_batteries(self, rows: Sequence[RowMapping]) -> list[dict]:
+        """Строки устройств с батареями: один запрос по индексу batteries.device_id на все устройства"""
+        return await attach_children(
+            self.session, rows, select(*self.BATTERY_COLUMNS).order_by(Battery.id), Battery.device_id, "batteries"
+        )
+
+    @classmethod
+    def columns(cls, fields: tuple[str, ...] | None = None) -> list:
+        """Колонки READ_COLUMNS, оставшиеся после ?fields= (None - все)"""
+        return [column for column in cls.READ_COLUMNS if fields is None or column.key in fields]
+
+    async def get_row(self, device_id: int, fields: tuple[str, ...]) -> dict | RowMapping | None:
+        """Выбранные колонки одного устройства, батареи - только если они в fields"""
+        rows = await fetch_rows(self.session, select(*self.columns(fields)).where(Device.id == device_id))
+        if not rows:
+            return None
+        if "batteries" not in fields:
+            return rows[0]
+        return (await self._with_batteries(rows))[0]
+
+    async def get_many(self, ids: list[int]) -> dict[int, dict]:
+        """
+        Получить устройства по списку id: один запрос WHERE id = ANY(:ids)
+        и один запрос батарей всех найденных устройств
+        """
+        rows = await fetch_rows(
+            self.session,
+            select(*self.READ_COLUMNS).where(Device.id == any_(bindparam("ids", sorted(set(ids)), type_=ARRAY(Integer))))
+        )
+        return {device["id"]: device for device in await self._with_batteries(rows)}
+    
+    async def search(self, q: str, limit: int = 20) -> list[dict]:
+        """Найти устройства по части имени, лучшие совпадения первыми (батареи - одним запросом)"""
+        rows = await fetch_rows(self.session, name_search(select(*self.READ_COLUMNS), Device.name, q, limit))
+        return await self._with_batteries(rows)
     
     async def get_all(self) -> DeviceList:
         #selectinload - позволяет заранее подгрузить все батареи для устройств одним дополнительным запросом
         #также делает 1 дополнительный запрос для всех связанных батарей вместо возможных N+1 запросах
         result=await self.session.execute(select(Device).options(selectinload(Device.batteries)))
         return result.scalars().all()
+
+    async def get_page(
+        self,
+        limit: int,
+        skip: int = 0,
+        cursor: str | None = None,
+        sort_by: str = "id",
+        order: str = "asc",
+        filters: DeviceFilter | None = None,
+        fields: tuple[str, ...] | None = None,
+        view: str = "full",
+    ) -> tuple[list, str | None, tuple]:
+        """
+        Получить страницу устройств: по курсору (keyset) или по skip/limit.
+        fields - читать только эти колонки (?fields=), view=summary - без батарей,
+        с их количеством и емкостью из одного GROUP BY.
+        Третье значение - версии страницы для list_etag, тем же запросом
+        """
+        with_batteries = self.shows_batteries(view, fields)
+        if view == "summary":
+            columns = [column for column in self.SUMMARY_COLUMNS if fields is None or column.key in fields]
+            stmt = select(*columns, *self.version_columns(with_batteries)).where(*self.filter_clauses(filters))
+            if any(column.key in self.SUMMARY_AGGREGATES for column in columns):
+                stmt = stmt.select_from(Device).outerjoin(Battery, Battery.device_id == Device.id).group_by(Device.id)
+            rows, next_cursor = await fetch_page(self.session, stmt, self.SORTABLE_COLUMNS, limit, skip, cursor, sort_by, order)
+            return rows, next_cursor, self.page_versions(rows, next_cursor, with_batteries)
+
+        #Батареи читаются только для устройств текущей страницы и только если они нужны
+        stmt = select(*self.columns(fields), *self.version_columns(with_batteries)).where(*self.filter_clauses(filters))
+        rows, next_cursor = await fetch_page(self.session, stmt, self.SORTABLE_COLUMNS, limit, skip, cursor, sort_by, order)
+        versions = self.page_versions(rows, next_cursor, with_batteries)
+        if not with_batteries:
+            return rows, next_cursor, versions
+        return await self._with_batteries(rows), next_cursor, versions
+
+    @classmethod
+    def shows_batteries(cls, view: str, fields: tuple[str, ...] | None) -> bool:
+        """Зависит ли ответ списка от батарей: сами батареи или их количество и емкость в сводке"""
+        if view == "summary":
+            return fields is None or any(name in fields for name in cls.SUMMARY_AGGREGATES)
+        return fields is None or "batteries" in fields
+
+    @staticmethod
+    def version_columns(with_batteries: bool) -> list:
+        """
+        Колонки версий для ETag страницы: версия устройства и, если ответ зависит от батарей,
+        количество, максимум и сумма версий его батарей (по индексу batteries.device_id)
+        """
+        if not with_batteries:
+            return [Device.version]
+        versions = aliased(Battery)
+        by_device = versions.device_id == Device.id
+        return [
+            Device.version,
+            select(func.count(versions.id)).where(by_device).scalar_subquery().label("battery_rows"),
+            select(func.coalesce(func.max(versions.version), 0)).where(by_device).scalar_subquery().label("battery_max_version"),
+            select(func.coalesce(func.sum(versions.version), 0)).where(by_device).scalar_subquery().label("battery_version_sum"),
+        ]
+
+    @staticmethod
+    def page_versions(rows: Sequence[RowMapping], next_cursor: str | None, with_batteries: bool) -> tuple:
+        """Свертка версий строк страницы (и их батарей) и признак следующей страницы"""
+        versions = (*versions_digest(row["version"] for row in rows), next_cursor is not None)
+        if with_batteries:
+            versions += (
+                sum(row["battery_rows"] for row in rows),
+                max((row["battery_max_version"] for row in rows), default=0),
+                sum(int(row["battery_version_sum"]) for row in rows),
+            )
+        return versions
+
+    @staticmethod
+    def list_etag(versions: tuple, total: int | None) -> str:
+        """ETag страницы списка по ее версиям и total"""
+        return make_etag("devices", *versions, total)
+
+    async def count(self, mode: str = "exact", filters: DeviceFilter | None = None) -> int | None:
+        """Посчитать устройства точно, оценкой планировщика или не считать"""
+        return await count_rows(self.session, select(Device.id).where(*self.filter_clauses(filters)), mode)
     
-    async def update(self, device_id: int, device_update: DeviceUpdate) -> Device | None:
-        device=await self.get(device_id)
-        if device:
-            update_data=device_update.model_dump(exclude_unset=True)
-            for field, value in update_data.items():
-                setattr(device, field, value)
-            await self.session.commit()
-            await self.session.refresh(device)
-        
+    @staticmethod
+    def etag_for(device: Device) -> str:
+        """ETag загруженного устройства: его версия и версии его батарей"""
+        return make_etag("device", device.version, *versions_digest(battery.version for battery in device.batteries))
+
+    async def get_etag(self, device_id: int) -> str | None:
+        """ETag устройства одним запросом по индексам, без ORM-объектов. None - устройства нет"""
         result = await self.session.execute(
-            select(Device)
-            .options(selectinload(Device.batteries))
-            .where(Device.id == device.id)
+            select(
+                Device.version,
+                func.count(Battery.id),
+                func.coalesce(func.max(Battery.version), 0),
+                func.coalesce(func.sum(Battery.version), 0),
+            )
+            .outerjoin(Battery, Battery.device_id == Device.id)
+            .where(Device.id == device_id)
+            .group_by(Device.id)
         )
-        device = result.scalar_one()
+        row = result.one_or_none()
+        if row is None:
+            return None
+        return make_etag("device", *(int(value) for value in row))
 
-        return device
-
-    async def patch(self, device_id: int, device_patch: DevicePatch) -> Device | None:
-        device=await self.get(device_id)
-        if device:
-            update_data=device_patch.model_dump(exclude_none=True, exclude_unset=True)
-            if not update_data:
-                raise ValueError("No fields to update")
-            for field, value in update_data.items():
-                setattr(device, field, value)
-            
-            await self.session.commit()
-            await self.session.refresh(device)
+    async def page_etag(
+        self,
+        limit: int,
+        skip: int = 0,
+        cursor: str | None = None,
+        sort_by: str = "id",
+        order: str = "asc",
+        total: int | None = None,
+        filters: DeviceFilter | None = None,
+        with_batteries: bool = True,
+    ) -> str:
+        """
+        ETag страницы до ее загрузки, для условного запроса.
+        Читает только id/version строк страницы и версии их батарей, без ORM-объектов и pydantic
+        """
+        stmt = select(Device.id, *self.version_columns(with_batteries)).where(*self.filter_clauses(filters))
+        rows, next_cursor = await fetch_page(self.session, stmt, self.SORTABLE_COLUMNS, limit, skip, cursor, sort_by, order)
+        return self.list_etag(self.page_versions(rows, next_cursor, with_batteries), total)
 
+    async def stream_export(self, chunk_size: int = 1000, filters: DeviceFilter | None = None) -> AsyncIterator[Sequence[RowMapping]]:
+        """
+        Потоково читать устройства пачками по chunk_size строк.
+        yield_per включает серверный курсор, поэтому таблица не грузится в память целиком
+        """
+        stmt = select(*self.EXPORT_COLUMNS).where(*self.filter_clauses(filters)).order_by(Device.id).execution_options(yield_per=chunk_size)
+        result = await self.session.stream(stmt)
+        async for partition in result.mappings().partitions(chunk_size):
+            yield partition
+    
+    async def _update_returning(self, device_id: int, data: dict) -> Device | None:
+        """
+        UPDATE ... RETURNING и загрузка батарей: два запроса на запись.
+        Уникальность имени проверяет база
+        """
+        try:
             result = await self.session.execute(
-                select(Device)
-                .options(selectinload(Device.batteries))
-                .where(Device.id == device.id)
+                update(Device)
+                .where(Device.id == device_id)
+                .values(**data)
+                .returning(Device)
+                .execution_options(synchronize_session=False)
             )
-            device = result.scalar_one()
+            device = result.scalar_one_or_none()
+            if device is None:
+                await self.session.rollback()
+                return None
+            batteries = await self.session.execute(select(Battery).where(Battery.device_id == device_id))
+            set_committed_value(device, "batteries", list(batteries.scalars().all()))
+            await self.session.commit()
+        except IntegrityError as e:
+            await self.session.rollback()
+            raise ValueError(integrity_error_message(e))
+        device_cache.invalidate(device_id)
         return device
+
+    async def update(self, device_id: int, device_update: DeviceUpdate) -> Device | None:
+        update_data=device_update.model_dump(exclude_unset=True)
+        return await self._update_returning(device_id, update_data)
+
+    async def patch(self, device_id: int, device_patch: DevicePatch) -> Device | None:
+        update_data=device_patch.model_dump(exclude_none=True, exclude_unset=True)
+        if not update_data:
+            raise ValueError("No fields to update")
+        return await self._update_returning(device_id, update_data)
     
     async def delete(self, device_id: int) -> bool:
-        device = await self.session.get(Device, device_id)
-        if device:
-            await self.session.delete(device)
-            await self.session.commit()
-            return True
-        return False
+        """
+        Удалить устройство и его батареи двумя запросами.
+        Батареи удаляются явно с RETURNING, их id нужны для сброса кэша
+        """
+        result = await self.session.execute(delete(Battery).where(Battery.device_id == device_id).returning(Battery.id))
+        battery_ids = list(result.scalars().all())
+        result = await self.session.execute(delete(Device).where(Device.id == device_id).returning(Device.id))
+        if result.scalar_one_or_none() is None:
+            await self.session.rollback()
+            return False
+        await self.session.commit()
+        stats_cache.invalidate()
+        device_cache.invalidate(device_id)
+        battery_cache.invalidate(*battery_ids)
+        return True
     
     async def get_by_name(self, name:str) -> Device | None:
         result= await self.session.execute(select(Device).where(Device.name==name).options(selectinload(Device.batteries)))
@@ -87,11 +335,6 @@ class DeviceCRUD:
     async def remove_battery_from_device(self, device_id: int, battery_id: int) -> bool:
         """Удалить батарею из устройства"""
         from app.crud.battery import BatteryCRUD
-        
-        battery_crud = BatteryCRUD(self.session)
-        battery = await battery_crud.get(battery_id)
-        
-        if battery and battery.device_id == device_id:
-            return await battery_crud.delete(battery_id)
-        
-        return False
\ No newline at end of file
+
+        #Принадлежность устройству проверяется в том же DELETE
+        return await BatteryCRUD(self.session).delete(battery_id, device_id=device_id)
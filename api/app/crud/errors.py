@@ -0,0 +1,30 @@
+from sqlalchemy.exc import IntegrityError
+
+#Сообщения для ограничений, которые проверяет сама база (вместо предварительных SELECT)
+CONSTRAINT_MESSAGES = {
+    "devices_name_key": "Device with this name already exists",
+    "ix_batteries_name": "Battery with this name already exists",
+    "batteries_device_id_fkey": "Device with id {device_id} not found",
+    "ck_devices_battery_count": "Device cannot have more than 5 batteries",
+}
+
+
+class NotFoundError(ValueError):
+    """
+    Связанный объект не найден.
+    Наследует ValueError, поэтому обработчики, ожидающие ValueError, по-прежнему отвечают 400
+    """
+
+
+def constraint_name(error: IntegrityError) -> str | None:
+    """Имя нарушенного ограничения из исключения asyncpg"""
+    cause = getattr(error.orig, "__cause__", None)
+    return getattr(cause, "constraint_name", None)
+
+
+def integrity_error_message(error: IntegrityError, **context) -> str:
+    """Понятное клиенту сообщение о нарушении ограничения"""
+    template = CONSTRAINT_MESSAGES.get(constraint_name(error))
+    if template is None:
+        return "Data integrity violation"
+    return template.format(**context)
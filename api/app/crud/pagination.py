@@ -0,0 +1,139 @@
+import base64
+import json
+from typing import Any
+
+from sqlalchemy import Select, and_, func, or_, select, tuple_
+from sqlalchemy.engine import RowMapping
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+def encode_cursor(sort_by: str, order: str, value: Any, last_id: int) -> str:
+    """Упаковывает позицию последней записи страницы в непрозрачный курсор"""
+    raw = json.dumps([sort_by, order, value, last_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, str, Any, int]:
+    """Распаковывает курсор, полученный от encode_cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_by, order, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        return sort_by, order, value, int(last_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def apply_keyset(stmt: Select, sort_column, id_column, order: str, cursor_value: Any = None, cursor_id: int | None = None) -> Select:
+    """
+    Добавляет к запросу сортировку (sort_column, id) и условие "после курсора".
+    Сравнение кортежей (col, id) > (:value, :id) позволяет Postgres
+    использовать составной индекс и не читать пропущенные строки.
+    NULL в колонке, допускающей его (device_id), всегда идет в конце: сравнение кортежа с NULL
+    дает NULL, поэтому для таких колонок условие раскрыто с явными ветками IS NULL
+    """
+    descending = order == "desc"
+    nullable = sort_column is not id_column and getattr(sort_column, "nullable", False)
+    if cursor_id is not None:
+        after_id = id_column < cursor_id if descending else id_column > cursor_id
+        if sort_column is id_column:
+            condition = after_id
+        elif nullable and cursor_value is None:
+            #Курсор уже в хвосте из NULL: дальше только NULL с большим (меньшим) id
+            condition = and_(sort_column.is_(None), after_id)
+        elif nullable:
+            after_value = sort_column < cursor_value if descending else sort_column > cursor_value
+            condition = or_(after_value, and_(sort_column == cursor_value, after_id), sort_column.is_(None))
+        else:
+            left = tuple_(sort_column, id_column)
+            right = tuple_(cursor_value, cursor_id)
+            condition = left < right if descending else left > right
+        stmt = stmt.where(condition)
+
+    if sort_column is id_column:
+        ordering = [id_column.desc() if descending else id_column.asc()]
+    elif descending:
+        ordering = [sort_column.desc(), id_column.desc()]
+    else:
+        ordering = [sort_column.asc(), id_column.asc()]
+    if nullable:
+        ordering[0] = ordering[0].nulls_last()
+    return stmt.order_by(*ordering)
+
+
+async def count_rows(session: AsyncSession, stmt: Select, mode: str) -> int | None:
+    """
+    Считает количество строк запроса.
+    exact - точный count(*), estimated - оценка планировщика из EXPLAIN
+    (не читает таблицу), none - не считать вовсе
+    """
+    if mode == "none":
+        return None
+
+    stmt = stmt.order_by(None).limit(None).offset(None)
+    if mode == "estimated":
+        connection = await session.connection()
+        compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+        #SQL уже со значениями: мимо text(), иначе ":слово" в строковом значении станет параметром
+        result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}")
+        plan = result.scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    result = await session.execute(select(func.count()).select_from(stmt.subquery()))
+    return result.scalar() or 0
+
+
+def keyset_statement(
+    stmt: Select,
+    sortable: dict,
+    skip: int = 0,
+    cursor: str | None = None,
+    sort_by: str = "id",
+    order: str = "asc",
+) -> tuple[Select, str, str]:
+    """
+    Добавляет к запросу сортировку и позицию страницы (без LIMIT).
+    Если передан cursor - сортировка берется из него, а skip игнорируется.
+    Возвращает запрос и фактические sort_by/order
+    """
+    cursor_value = cursor_id = None
+    if cursor:
+        sort_by, order, cursor_value, cursor_id = decode_cursor(cursor)
+        if sort_by not in sortable or order not in ("asc", "desc"):
+            raise ValueError("Invalid cursor")
+
+    stmt = apply_keyset(stmt, sortable[sort_by], sortable["id"], order, cursor_value, cursor_id)
+    if not cursor and skip:
+        stmt = stmt.offset(skip)
+    return stmt, sort_by, order
+
+
+async def fetch_page(
+    session: AsyncSession,
+    stmt: Select,
+    sortable: dict,
+    limit: int,
+    skip: int = 0,
+    cursor: str | None = None,
+    sort_by: str = "id",
+    order: str = "asc",
+) -> tuple[list[RowMapping], str | None]:
+    """
+    Возвращает одну страницу запроса по колонкам (строки-маппинги) и курсор следующей страницы.
+    Колонка сортировки, которой нет среди выбранных, добавляется для курсора
+    """
+    stmt, sort_by, order = keyset_statement(stmt, sortable, skip, cursor, sort_by, order)
+    if sort_by not in stmt.selected_columns.keys():
+        stmt = stmt.add_columns(sortable[sort_by])
+
+    # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+    result = await session.execute(stmt.limit(limit + 1))
+    rows = list(result.mappings().all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_by, order, last[sort_by], last["id"])
+    return rows, next_cursor
@@ -0,0 +1,39 @@
+from typing import Sequence
+
+from sqlalchemy import Integer, Select, any_, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.engine import RowMapping
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def fetch_rows(session: AsyncSession, stmt: Select) -> Sequence[RowMapping]:
+    """
+    Строки запроса по отдельным колонкам в виде маппингов.
+    ORM-объекты не создаются: нет identity map, отслеживания изменений и загрузки связей
+    """
+    result = await session.execute(stmt)
+    return result.mappings().all()
+
+
+async def attach_children(
+    session: AsyncSession,
+    parents: Sequence[RowMapping],
+    stmt: Select,
+    foreign_key,
+    key: str,
+) -> list[dict]:
+    """
+    Копирует строки родителей в словари и кладет в каждый список дочерних строк под ключом key.
+    Дочерние строки читаются одним запросом foreign_key = ANY(:ids) - как selectinload, но без ORM
+    """
+    items = [{**row, key: []} for row in parents]
+    if not items:
+        return items
+    children = {item["id"]: item[key] for item in items}
+    rows = await fetch_rows(
+        session,
+        stmt.where(foreign_key == any_(bindparam("parent_ids", sorted(children), type_=ARRAY(Integer)))),
+    )
+    for row in rows:
+        children[row[foreign_key.key]].append(row)
+    return items
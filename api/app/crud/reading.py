@@ -0,0 +1,137 @@
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func, update, bindparam, Date, DateTime, Float, Integer
+from sqlalchemy.dialects.postgresql import ARRAY
+from app.config import settings
+from app.models.battery import Battery
+from app.models.reading import BatteryReading
+from app.schemas.reading import ReadingCreate
+from app.services.stats import stats_cache
+from app.services.cache import battery_cache, device_cache
+
+class ReadingCRUD:
+    #Порядок колонок для COPY
+    COPY_COLUMNS = ("battery_id", "recorded_at", "voltage", "capacity")
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def ingest(self, readings: list[ReadingCreate]) -> tuple[int, list[dict]]:
+        """
+        Записать пачку показаний.
+        Строки пишутся через COPY, а текущая емкость батарей обновляется
+        одним UPDATE ... FROM по последнему показанию каждой батареи,
+        если в базе нет показания новее.
+        Возвращает количество записанных показаний и отклоненные элементы
+        """
+        now = datetime.now(timezone.utc)
+        oldest = now - timedelta(days=settings.READINGS_RETENTION_DAYS)
+        newest = now + timedelta(hours=settings.READINGS_MAX_FUTURE_HOURS)
+        rejected, in_window = [], []
+        for index, reading in enumerate(readings):
+            if not oldest <= reading.recorded_at <= newest:
+                rejected.append({
+                    "index": index,
+                    "battery_id": reading.battery_id,
+                    "detail": f"recorded_at must be between {oldest.isoformat()} and {newest.isoformat()}"
+                })
+                continue
+            in_window.append((index, reading))
+        if not in_window:
+            return 0, rejected
+
+        await self._ensure_partitions({reading.recorded_at.date() for _, reading in in_window})
+
+        # Блокировка FOR KEY SHARE до конца транзакции не дает удалить батареи до COPY
+        battery_ids = {reading.battery_id for _, reading in in_window}
+        result = await self.session.execute(
+            select(Battery.id, Battery.device_id)
+            .where(Battery.id.in_(list(battery_ids)))
+            .with_for_update(read=True, key_share=True)
+        )
+        device_by_battery = dict(result.all())
+
+        records = []
+        latest: dict[int, ReadingCreate] = {}
+        for index, reading in in_window:
+            if reading.battery_id not in device_by_battery:
+                rejected.append({
+                    "index": index,
+                    "battery_id": reading.battery_id,
+                    "detail": f"Battery with id {reading.battery_id} not found"
+                })
+                continue
+            records.append((reading.battery_id, reading.recorded_at, reading.voltage, reading.capacity))
+            current = latest.get(reading.battery_id)
+            if current is None or reading.recorded_at >= current.recorded_at:
+                latest[reading.battery_id] = reading
+        rejected.sort(key=lambda item: item["index"])
+
+        if not records:
+            return 0, rejected
+
+        # COPY идет через asyncpg-соединение текущей транзакции
+        connection = await self.session.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            BatteryReading.__tablename__,
+            records=records,
+            columns=self.COPY_COLUMNS
+        )
+
+        values = func.unnest(
+            bindparam("ids", list(latest), type_=ARRAY(Integer)),
+            bindparam("capacities", [reading.capacity for reading in latest.values()], type_=ARRAY(Float)),
+            bindparam("recorded", [reading.recorded_at for reading in latest.values()], type_=ARRAY(DateTime(timezone=True))),
+        ).table_valued("id", "capacity", "recorded_at").render_derived(name="v")
+        # Опоздавшая пачка со старыми показаниями не откатывает емкость назад
+        newer = (
+            select(BatteryReading.battery_id)
+            .where(BatteryReading.battery_id == values.c.id, BatteryReading.recorded_at > values.c.recorded_at)
+            .correlate(values)
+            .exists()
+        )
+        await self.session.execute(
+            update(Battery)
+            .where(Battery.id == values.c.id, ~newer)
+            .values(residual_capacity=values.c.capacity)
+            .execution_options(synchronize_session=False)
+        )
+        await self.session.commit()
+        stats_cache.invalidate()
+        battery_cache.invalidate(*latest)
+        device_cache.invalidate(*{device_by_battery[battery_id] for battery_id in latest})
+        return len(records), rejected
+
+    async def _ensure_partitions(self, days: set[date]) -> None:
+        """
+        Создать недостающие суточные секции отдельной короткой транзакцией.
+        Проверяется при каждой записи, без кэша в процессе: секцию могли удалить
+        (очистка старых данных, ручной DETACH), а CREATE TABLE IF NOT EXISTS для
+        существующей секции - только поиск по каталогу
+        """
+        await self.session.execute(
+            select(func.ensure_battery_readings_partition(
+                func.unnest(bindparam("days", sorted(days), type_=ARRAY(Date)))
+            ))
+        )
+        # DDL не держит блокировку родительской таблицы на время COPY
+        await self.session.commit()
+
+    async def get_by_battery(
+        self,
+        battery_id: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        limit: int = 1000,
+    ) -> list[BatteryReading]:
+        """Получить историю показаний батареи, новые первыми"""
+        stmt = select(BatteryReading).where(BatteryReading.battery_id == battery_id)
+        # Границы по времени позволяют Postgres читать только нужные секции
+        if since is not None:
+            stmt = stmt.where(BatteryReading.recorded_at >= since)
+        if until is not None:
+            stmt = stmt.where(BatteryReading.recorded_at < until)
+        result = await self.session.execute(stmt.order_by(BatteryReading.recorded_at.desc()).limit(limit))
+        return result.scalars().all()
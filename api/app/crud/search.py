@@ -0,0 +1,37 @@
+from sqlalchemy import Select, func
+
+#Короче трех символов триграммный индекс не помогает, ищем по префиксу через B-tree
+TRIGRAM_MIN_LENGTH = 3
+
+#Символ экранирования в LIKE (не обратный слеш, его запись зависит от standard_conforming_strings)
+LIKE_ESCAPE = "!"
+
+
+def escape_like(value: str) -> str:
+    """Экранирует спецсимволы LIKE, чтобы пользовательский ввод искался буквально"""
+    return value.replace(LIKE_ESCAPE, LIKE_ESCAPE * 2).replace("%", LIKE_ESCAPE + "%").replace("_", LIKE_ESCAPE + "_")
+
+
+def name_search(stmt: Select, column, q: str, limit: int) -> Select:
+    """
+    Добавляет к запросу поиск по имени и ранжирование.
+    Длинные запросы - подстрока (ILIKE) или опечатка (оператор % pg_trgm) по GIN-индексу,
+    сначала совпадения по префиксу, затем по similarity.
+    Короткие - только префикс по индексу lower(name) COLLATE "C"
+    """
+    q = q.strip()
+    lowered = func.lower(column).collate("C")
+    prefix = escape_like(q.lower()) + "%"
+    if len(q) < TRIGRAM_MIN_LENGTH:
+        return stmt.where(lowered.like(prefix, escape=LIKE_ESCAPE)).order_by(lowered).limit(limit)
+
+    substring = column.ilike("%" + escape_like(q) + "%", escape=LIKE_ESCAPE)
+    return (
+        stmt.where(substring | column.op("%")(q))
+        .order_by(
+            lowered.like(prefix, escape=LIKE_ESCAPE).desc(),
+            func.similarity(column, q).desc(),
+            column,
+        )
+        .limit(limit)
+    )
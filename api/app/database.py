@@ -1,27 +1,117 @@
+import asyncio
+import time
 from typing import AsyncGenerator
 
-from fastapi import Depends
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from fastapi import Depends, Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 
 from .config import settings
+from .pool import InstrumentedPool
+from .replicas import ReplicaSet
 
 DATABASE_URL=f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASS}@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 
 class Base(DeclarativeBase):
     pass
 
-engine=create_async_engine(
-    DATABASE_URL,
-    echo=True,
-)
-async_session_maker=async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+#Методы, которые можно читать из реплики, и cookie, которая после записи клиента
+#на DB_READ_STICKY_SECONDS отправляет его чтения в primary (read-your-writes)
+READ_METHODS=("GET", "HEAD")
+STICKY_COOKIE="db_primary_until"
 
-async def get_async_session()->AsyncGenerator[AsyncSession, None]:
+def create_engine(url: str = DATABASE_URL) -> AsyncEngine:
+    """Движок с пулом соединений InstrumentedPool по настройкам DB_*"""
+    return create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        #Кэш подготовленных выражений asyncpg на соединение (0 - выключить, нужно за pgbouncer)
+        connect_args={"prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE},
+    )
+
+#Движок создается в процессе, который будет с ним работать (в lifespan воркера, после fork),
+#а не при импорте: соединения пула нельзя унаследовать от родительского процесса
+engine: AsyncEngine | None = None
+async_session_maker=async_sessionmaker(class_=AsyncSession, expire_on_commit=False)
+replicas=ReplicaSet()
+
+def init_engine() -> AsyncEngine:
+    """
+    Создать движок текущего процесса и привязать к нему сессии (повторный вызов вернет тот же).
+    Движки реплик из DB_REPLICA_URLS создаются тут же
+    """
+    global engine
+    if engine is None:
+        engine=create_engine()
+        async_session_maker.configure(bind=engine)
+        replicas.configure(
+            engine,
+            [create_engine(url.strip()) for url in settings.DB_REPLICA_URLS.split(",") if url.strip()],
+            settings.DB_REPLICA_MAX_LAG,
+            settings.DB_REPLICA_CHECK_INTERVAL,
+        )
+    return engine
+
+def get_engine() -> AsyncEngine:
+    if engine is None:
+        raise RuntimeError("Database engine is not initialized, call init_engine() first")
+    return engine
+
+async def ping(timeout: float) -> float:
+    """Время SELECT 1 через пул, с; TimeoutError, если база не ответила за timeout"""
+    async def select_one() -> None:
+        async with get_engine().connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    started=time.perf_counter()
+    await asyncio.wait_for(select_one(), timeout)
+    return time.perf_counter() - started
+
+async def dispose_engine() -> None:
+    """Закрыть все соединения пула и отвязать сессии"""
+    global engine
+    if engine is not None:
+        await replicas.dispose()
+        await engine.dispose()
+        engine=None
+        async_session_maker.configure(bind=None)
+
+def sticky_to_primary(request: Request) -> bool:
+    """Клиент недавно писал: его чтения идут в primary, пока не истечет окно из cookie"""
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def route_session(request: Request) -> tuple[str, async_sessionmaker]:
+    """Куда отправить запрос: GET/HEAD - в здоровую реплику по кругу, остальное и fallback - в primary"""
+    if request.method in READ_METHODS and replicas.replicas and not sticky_to_primary(request):
+        replica=replicas.pick()
+        if replica is not None:
+            return replica.name, replica.session_maker
+    return "primary", async_session_maker
+
+def is_replica(session: AsyncSession) -> bool:
+    """Сессия читает из реплики (данные могут отставать на DB_REPLICA_MAX_LAG)"""
+    return session.info.get("db_route", "primary") != "primary"
+
+async def get_async_session(request: Request)->AsyncGenerator[AsyncSession, None]:
     """
-    Генератор асинхронных сессий
+    Генератор асинхронных сессий: чтения - из реплик, если они настроены, изменения - в primary.
+    Если реплика упадет посреди запроса, сессия дочитает из primary (ReplicaSession)
     """
-    async with async_session_maker() as session:
+    route, session_maker=route_session(request)
+    request.state.db_route=route
+    async with session_maker() as session:
+        session.info["db_route"]=route
+        session.info["request_state"]=request.state
         try:
             yield session
         finally:
@@ -1,18 +1,56 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.responses import FileResponse
 from app.routers.battery import router as battery_router
 from app.routers.device import router as device_router
+from app.routers.reading import router as reading_router
+from app.routers.metrics import router as metrics_router
+from app.routers.health import router as health_router
 from fastapi.middleware.cors import CORSMiddleware
+from app.database import dispose_engine, init_engine, replicas
+from app.middleware.query_counter import QueryCounterMiddleware, install_query_listeners
+from app.middleware.compression import CompressionMiddleware
+from app.middleware.read_after_write import ReadAfterWriteMiddleware
+from app.services.alerts import alert_broadcaster
+from app.services.alert_sets import alert_sets
+from app.services.warmup import warmup
+from app.config import settings
 
 origins = [
     "http://localhost:3000",
     "http://127.0.0.1:3000"
 ]
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ресурсы процесса: движок и пул соединений (создаются в каждом воркере, прогреваются
+    в фоне и закрываются при остановке), LISTEN-соединение потока алертов и сверка алертов в памяти
+    """
+    engine=init_engine()
+    install_query_listeners(engine.sync_engine)
+    for replica in replicas.replicas:
+        install_query_listeners(replica.engine.sync_engine)
+    await replicas.start()
+    warmup.start(settings.DB_POOL_WARMUP, settings.DB_PREPARE_STATEMENTS)
+    if settings.ALERT_STREAM_ENABLED:
+        await alert_broadcaster.start()
+        await alert_sets.start()
+    try:
+        yield
+    finally:
+        await warmup.stop()
+        await alert_sets.stop()
+        await alert_broadcaster.stop()
+        await replicas.stop()
+        await dispose_engine()
+
 app = FastAPI(
     title="Battery Monitoring API",
     description="API для мониторинга аккумуляторных батарей и устройств",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -21,11 +59,19 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-DB-Query-Count", "X-DB-Time-Ms", "X-DB-Route"],
 )
+app.add_middleware(QueryCounterMiddleware)
+app.add_middleware(ReadAfterWriteMiddleware)
+#Снаружи остальных: сжимается уже готовый ответ со всеми заголовками
+app.add_middleware(CompressionMiddleware)
 
 
 app.include_router(device_router, prefix="/api/devices", tags=["devices"])
 app.include_router(battery_router, prefix="/api/batteries", tags=["batteries"])
+app.include_router(reading_router, prefix="/api/readings", tags=["readings"])
+app.include_router(metrics_router, prefix="/metrics", tags=["metrics"])
+app.include_router(health_router, prefix="/health", tags=["health"])
 
 @app.get("/")
 async def root():
@@ -35,7 +81,3 @@ async def root():
         "docs": "/docs",
         "redoc": "/redoc"
     }
-
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy"}
@@ -0,0 +1,257 @@
+import zlib
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+#Что сжимать: JSON, NDJSON и CSV выгрузок. text/event-stream (поток алертов) не сжимается:
+#буфер компрессора задерживал бы события и heartbeat
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/csv", "text/plain", "text/html")
+
+#Уровни сжатия по именам профилей: у каждого кодека своя шкала.
+#max ограничен уровнями, которые еще годятся для сжатия на лету (br 11 и zstd 19 - сотни мс на страницу)
+LEVELS = {
+    "gzip": {"fast": 1, "balanced": 6, "max": 9},
+    "br": {"fast": 1, "balanced": 5, "max": 9},
+    "zstd": {"fast": 1, "balanced": 3, "max": 12},
+}
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        #wbits=31 - формат gzip с заголовком и контрольной суммой
+        self._obj = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level: int):
+        self._obj = brotli.Compressor(quality=level)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.process(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush()
+
+    def finish(self) -> bytes:
+        return self._obj.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._obj = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._obj.compress(data)
+
+    def flush(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        return self._obj.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_codecs() -> dict[str, type]:
+    """Кодеки, для которых установлены библиотеки (brotli и zstandard необязательны)"""
+    codecs = {"gzip": GzipCompressor}
+    if brotli is not None:
+        codecs["br"] = BrotliCompressor
+    if zstandard is not None:
+        codecs["zstd"] = ZstdCompressor
+    return codecs
+
+
+CODECS = available_codecs()
+
+
+def compress(encoding: str, data: bytes, profile: str = "balanced") -> bytes:
+    """Сжать тело целиком (для бенчмарка и проверок)"""
+    compressor = CODECS[encoding](LEVELS[encoding][profile])
+    return compressor.compress(data) + compressor.finish()
+
+
+def _compress_chunk(compressor, data: bytes, last: bool) -> bytes:
+    return compressor.compress(data) + (compressor.finish() if last else compressor.flush())
+
+
+async def compress_chunk(compressor, data: bytes, last: bool) -> bytes:
+    """
+    Сжать кусок и сбросить буфер компрессора. Куски от COMPRESSION_THREAD_SIZE сжимаются
+    в потоке, чтобы br и zstd на больших выгрузках не блокировали event loop
+    """
+    if len(data) >= settings.COMPRESSION_THREAD_SIZE:
+        return await anyio.to_thread.run_sync(_compress_chunk, compressor, data, last)
+    return _compress_chunk(compressor, data, last)
+
+
+def negotiate(accept_encoding: str | None, preferred: list[str]) -> str | None:
+    """
+    Кодек из Accept-Encoding: наибольший q, при равных - первый в preferred.
+    q=0 запрещает кодек, * разрешает все не названные явно
+    """
+    if not accept_encoding:
+        return None
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in preferred:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def route_profile(path: str) -> str:
+    """Класс маршрута -> профиль сжатия: потоковые выгрузки сжимаются быстрее, остальные ответы плотнее"""
+    if path.endswith("/export"):
+        return settings.COMPRESSION_EXPORT_LEVEL
+    return settings.COMPRESSION_LEVEL
+
+
+def _tagged(etag: str, encoding: str) -> str:
+    """ETag сжатого представления: "abc" -> "abc-gzip" (у разных представлений разные сильные ETag)"""
+    return f"{etag[:-1]}-{encoding}\"" if etag.endswith('"') else etag
+
+
+def _strip_tags(if_none_match: str) -> str:
+    """Убрать суффиксы кодеков из If-None-Match, чтобы обработчики сравнивали свои ETag"""
+    tags = []
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        for encoding in LEVELS:
+            suffix = f"-{encoding}\""
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+                break
+        tags.append(tag)
+    return ", ".join(tags)
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы кодеком из Accept-Encoding (zstd, br, gzip).
+    Тела меньше COMPRESSION_MIN_SIZE (чтение одной записи, 304, ошибки) уходят как есть.
+    Потоковые ответы сжимаются по кускам со сбросом буфера после каждого, поэтому выгрузки
+    остаются потоковыми. ETag сжатого ответа получает суффикс кодека
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        profile = route_profile(scope["path"])
+        preferred = [name.strip() for name in settings.COMPRESSION_ENCODINGS.split(",") if name.strip() in CODECS]
+        request_headers = Headers(scope=scope)
+        encoding = negotiate(request_headers.get("accept-encoding"), preferred) if profile != "off" else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = request_headers.get("if-none-match")
+        if if_none_match:
+            scope = dict(scope)
+            stripped = _strip_tags(if_none_match)
+            scope["headers"] = [
+                (key, stripped.encode("latin-1") if key == b"if-none-match" else value)
+                for key, value in scope["headers"]
+            ]
+
+        start: Message | None = None
+        compressor = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, compressor
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(scope=start)
+                etag = headers.get("etag")
+                if start["status"] == 304 and etag and if_none_match and _tagged(etag, encoding) in if_none_match:
+                    # 304 повторяет ETag того представления, которое закэшировал клиент
+                    headers["ETag"] = _tagged(etag, encoding)
+                if not self._compressible(start, headers) or (not more_body and len(body) < settings.COMPRESSION_MIN_SIZE):
+                    if self._compressible_type(headers):
+                        headers.add_vary_header("Accept-Encoding")
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+
+                compressor = CODECS[encoding](LEVELS[encoding][profile])
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if etag:
+                    headers["ETag"] = _tagged(etag, encoding)
+                if "content-length" in headers:
+                    del headers["content-length"]
+                if not more_body:
+                    body = await compress_chunk(compressor, body, last=True)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start)
+                    start = None
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                await send(start)
+                start = None
+
+            if compressor is None:
+                await send(message)
+                return
+            #Сброс после каждого куска: клиент получает данные сразу, а не по заполнении буфера
+            chunk = await compress_chunk(compressor, body, last=not more_body)
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _compressible_type(headers: MutableHeaders) -> bool:
+        content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+        return content_type in COMPRESSIBLE_TYPES
+
+    def _compressible(self, start: Message, headers: MutableHeaders) -> bool:
+        return (
+            start["status"] not in (204, 304)
+            and "content-encoding" not in headers
+            and self._compressible_type(headers)
+        )
@@ -0,0 +1,129 @@
+import json
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+logger = logging.getLogger("app.sql")
+
+
+class RequestQueries:
+    """SQL-запросы одного HTTP-запроса: количество, суммарное время и повторы"""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: Counter[str] = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.duration += seconds
+        self.statements[statement] += 1
+
+    def problems(self, budget: int, repeat_threshold: int) -> list[str]:
+        """Превышение бюджета запросов и подозрения на N+1"""
+        found = []
+        if budget and self.count > budget:
+            found.append(f"{self.count} queries exceed budget of {budget}")
+        for statement, times in self.statements.most_common():
+            if times < repeat_threshold:
+                break
+            found.append(f"possible N+1, statement executed {times} times: {' '.join(statement.split())[:200]}")
+        return found
+
+
+_current: ContextVar[RequestQueries | None] = ContextVar("request_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    if queries is None:
+        return
+    started = conn.info["query_started"].pop()
+    queries.record(statement, time.perf_counter() - started)
+
+
+def install_query_listeners(engine: Engine) -> None:
+    """Подписаться на выполнение запросов движка (sync_engine у AsyncEngine)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryCounterMiddleware:
+    """
+    Считает SQL-запросы каждого HTTP-запроса.
+    Добавляет заголовки X-DB-Query-Count и X-DB-Time-Ms, пишет строку в лог app.sql
+    и предупреждает о превышении бюджета запросов или повторах одного запроса.
+    В строгом режиме такой ответ заменяется на 500 (для тестов и бенчмарков)
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.SQL_COUNTER_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = _current.set(queries)
+        started = time.perf_counter()
+        status_code = None
+        rejected = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, rejected
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                problems = queries.problems(settings.SQL_QUERY_BUDGET, settings.SQL_REPEAT_THRESHOLD)
+                if problems and settings.SQL_STRICT_MODE:
+                    rejected = True
+                    status_code = 500
+                    body = json.dumps({"detail": "SQL query budget exceeded", "problems": problems}).encode()
+                    await send({
+                        "type": "http.response.start",
+                        "status": 500,
+                        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+                    })
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(queries.count)
+                headers["X-DB-Time-Ms"] = f"{queries.duration * 1000:.2f}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._log(scope, status_code, queries, time.perf_counter() - started)
+
+    def _log(self, scope: Scope, status_code: int | None, queries: RequestQueries, elapsed: float) -> None:
+        problems = queries.problems(settings.SQL_QUERY_BUDGET, settings.SQL_REPEAT_THRESHOLD)
+        record = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "queries": queries.count,
+            "db_ms": round(queries.duration * 1000, 2),
+            "total_ms": round(elapsed * 1000, 2),
+        }
+        if problems:
+            record["problems"] = problems
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.info(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,41 @@
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.database import READ_METHODS, STICKY_COOKIE
+
+
+class ReadAfterWriteMiddleware:
+    """
+    Read-your-writes при чтении из реплик. После успешного изменения (не GET/HEAD, статус < 400)
+    ставит клиенту cookie, и его чтения DB_READ_STICKY_SECONDS секунд идут в primary.
+    Заголовок X-DB-Route показывает, откуда читал запрос: primary или replica-N
+    """
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not settings.DB_REPLICA_URLS:
+            await self.app(scope, receive, send)
+            return
+
+        #request.state обработчиков пишет в этот же словарь
+        state = scope.setdefault("state", {})
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                route = state.get("db_route")
+                if route:
+                    headers["X-DB-Route"] = route
+                if scope["method"] not in READ_METHODS and message["status"] < 400 and settings.DB_READ_STICKY_SECONDS > 0:
+                    until = time.time() + settings.DB_READ_STICKY_SECONDS
+                    headers.append(
+                        "Set-Cookie",
+                        f"{STICKY_COOKIE}={until:.3f}; Max-Age={int(settings.DB_READ_STICKY_SECONDS) + 1}; Path=/; HttpOnly; SameSite=Lax"
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, ForeignKey, Integer, String, Float
+from sqlalchemy import BigInteger, Column, FetchedValue, ForeignKey, Index, Integer, String, Float, text
 from sqlalchemy.orm import relationship
 from app.database import Base
 
@@ -12,6 +12,7 @@ class Battery(Base):
     residual_capacity - остаточная емкость
     service_life - срок службы в днях
     device_id - внешний ключ на таблицу devices
+    version - версия строки, растет при каждом изменении
 
     Battery Entity Data Model
     Contains:
@@ -21,6 +22,7 @@ class Battery(Base):
     residual_capacity - residual capacity
     service_life - service life in days
     device_id - foreign key to the devices table
+    version - row version, grows on every change
     """
     __tablename__="batteries"
 
@@ -30,5 +32,20 @@ class Battery(Base):
     residual_capacity=Column(Float, nullable=False)
     service_life=Column(Integer, nullable=False)
 
-    device_id=Column(Integer, ForeignKey('devices.id', ondelete="CASCADE"))
-    device=relationship("Device", back_populates="batteries")
\ No newline at end of file
+    device_id=Column(Integer, ForeignKey('devices.id', ondelete="CASCADE"), index=True)
+    #Берется из общей последовательности row_version_seq, при UPDATE обновляется триггером
+    version=Column(BigInteger, nullable=False, index=True, server_default=text("nextval('row_version_seq')"), server_onupdate=FetchedValue())
+    device=relationship("Device", back_populates="batteries")
+
+    #Индексы (колонка, id) под фильтры по диапазону и keyset-пагинацию с сортировкой по колонке
+    __table_args__ = (
+        Index("ix_batteries_residual_capacity_id", "residual_capacity", "id"),
+        Index("ix_batteries_service_life_id", "service_life", "id"),
+        Index("ix_batteries_nominal_voltage_id", "nominal_voltage", "id"),
+        #Поиск по имени: подстрока/опечатки (pg_trgm) и префикс
+        Index("ix_batteries_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_batteries_name_lower_prefix", text('lower(name) COLLATE "C"')),
+    )
+
+    #Забирать версию через RETURNING сразу при INSERT/UPDATE
+    __mapper_args__ = {"eager_defaults": True}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey
+from sqlalchemy import BigInteger, CheckConstraint, Column, FetchedValue, Index, Integer, String, Boolean, ForeignKey, text
 from sqlalchemy.orm import relationship, validates
 from app.database import Base
 
@@ -9,14 +9,18 @@ class Device(Base):
     id - идентификатор(первичный ключ)\n
     name - уникальное название\n
     firmware_version - версия прошивки\n
-    is_active - состояние вкл/выкл
+    is_active - состояние вкл/выкл\n
+    battery_count - количество батарей, ведется триггерами на batteries\n
+    version - версия строки, растет при каждом изменении
 
     Device Entity Data Model\n
     Contains:\n
     id - identifier (primary key)\n
     name - unique name\n
     firmware_version - firmware version\n
-    is_active - on/off status
+    is_active - on/off status\n
+    battery_count - number of batteries, maintained by triggers on batteries\n
+    version - row version, grows on every change
     """
     __tablename__="devices"
 
@@ -24,11 +28,27 @@ class Device(Base):
     name = Column(String, unique=True, nullable=False)
     firmware_version = Column(String, nullable=False)
     is_active =  Column(Boolean, default=True)
+    #Счетчик батарей ведут триггеры на batteries, CHECK не дает превысить 5 даже при параллельных вставках
+    battery_count = Column(Integer, nullable=False, server_default=text("0"), server_onupdate=FetchedValue())
+    #Берется из общей последовательности row_version_seq, при UPDATE обновляется триггером
+    version = Column(BigInteger, nullable=False, index=True, server_default=text("nextval('row_version_seq')"), server_onupdate=FetchedValue())
 
     #Связь с аккумуляторами (ограничение по тз в 5)
     #Relationship with batteries (requirements for 5)
     batteries= relationship("Battery", back_populates="device", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        CheckConstraint("battery_count BETWEEN 0 AND 5", name="ck_devices_battery_count"),
+        Index("ix_devices_firmware_version_id", "firmware_version", "id"),
+        Index("ix_devices_battery_count_id", "battery_count", "id"),
+        #Поиск по имени: подстрока/опечатки (pg_trgm) и префикс
+        Index("ix_devices_name_trgm", "name", postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"}),
+        Index("ix_devices_name_lower_prefix", text('lower(name) COLLATE "C"')),
+    )
+
+    #Забирать версию через RETURNING сразу при INSERT/UPDATE
+    __mapper_args__ = {"eager_defaults": True}
+
     @validates('batteries')
     def validate_batteries_count(self, key, battery):
         if len(self.battaries) > 5:
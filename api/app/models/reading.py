@@ -0,0 +1,33 @@
+from sqlalchemy import Column, DateTime, Float, ForeignKey, Index, Integer
+from app.database import Base
+
+class BatteryReading(Base):
+    """
+    Модель показаний телеметрии АКБ (только добавление, секционирование по дням)
+    Содержит:
+    battery_id - внешний ключ на таблицу batteries
+    recorded_at - время снятия показания
+    voltage - напряжение
+    capacity - остаточная емкость в процентах
+
+    Battery telemetry reading (append-only, partitioned by day)
+    Contains:
+    battery_id - foreign key to the batteries table
+    recorded_at - time the reading was taken
+    voltage - voltage
+    capacity - residual capacity in percent
+    """
+    __tablename__="battery_readings"
+    __table_args__ = (
+        Index("ix_battery_readings_battery_id_recorded_at", "battery_id", "recorded_at"),
+        {"postgresql_partition_by": "RANGE (recorded_at)"},
+    )
+
+    battery_id=Column(Integer, ForeignKey('batteries.id', ondelete="CASCADE"), nullable=False)
+    recorded_at=Column(DateTime(timezone=True), nullable=False)
+    voltage=Column(Float, nullable=False)
+    capacity=Column(Float, nullable=False)
+
+    #В таблице нет первичного ключа (повторы не проверяются, чтобы писать через COPY),
+    #ORM достаточно знать, как идентифицировать строку
+    __mapper_args__ = {"primary_key": [battery_id, recorded_at]}
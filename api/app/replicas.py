@@ -0,0 +1,206 @@
+import asyncio
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+logger = logging.getLogger("app.database")
+
+#Задержка реплики, с: 0, если она применила весь полученный WAL (или это не реплика),
+#иначе время с момента последней примененной транзакции
+LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+def is_disconnect(error: BaseException) -> bool:
+    """Ошибка связи с сервером (а не ошибка самого запроса): его можно повторить на другом сервере"""
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+class ReplicaSession(AsyncSession):
+    """
+    Сессия чтения из реплики. Если реплика оборвала соединение посреди запроса, она помечается
+    недоступной до следующей проверки, сессия переключается на primary и выражение повторяется
+    один раз. Уже начатый поток выгрузки (stream) так не спасти: ответ отправляется по частям
+    """
+    async def execute(self, *args, **kwargs):
+        try:
+            return await super().execute(*args, **kwargs)
+        except Exception as e:
+            if not await self._fail_over(e):
+                raise
+        return await super().execute(*args, **kwargs)
+
+    async def stream(self, *args, **kwargs):
+        try:
+            return await super().stream(*args, **kwargs)
+        except Exception as e:
+            if not await self._fail_over(e):
+                raise
+        return await super().stream(*args, **kwargs)
+
+    async def connection(self, *args, **kwargs):
+        try:
+            return await super().connection(*args, **kwargs)
+        except Exception as e:
+            if not await self._fail_over(e):
+                raise
+        return await super().connection(*args, **kwargs)
+
+    async def _fail_over(self, error: Exception) -> bool:
+        replica = self.info.get("replica")
+        replica_set = self.info.get("replica_set")
+        if replica is None or replica_set.primary is None or not is_disconnect(error):
+            return False
+        replica_set.mark_down(replica, error)
+        await self.close()
+        self.bind = replica_set.primary
+        self.sync_session.bind = replica_set.primary.sync_engine
+        del self.info["replica"]
+        self.info["db_route"] = "primary"
+        #X-DB-Route должен показать, что ответ в итоге прочитан из primary
+        state = self.info.get("request_state")
+        if state is not None:
+            state.db_route = "primary"
+        return True
+
+
+class Replica:
+    """Движок одной реплики и результат ее последней проверки"""
+    def __init__(self, name: str, engine: AsyncEngine, replica_set: "ReplicaSet"):
+        self.name = name
+        self.engine = engine
+        self.session_maker = async_sessionmaker(
+            engine,
+            class_=ReplicaSession,
+            expire_on_commit=False,
+            info={"replica": self, "replica_set": replica_set},
+        )
+        self.up = False
+        self.lag: float | None = None
+        self.error: str | None = None
+        self.checked_at: float | None = None
+        self.sessions = 0
+
+
+class ReplicaSet:
+    """
+    Реплики для чтения. Сессии выдаются по кругу только здоровым: реплика доступна
+    и отстает не больше max_lag секунд. Проверка идет в фоне раз в interval секунд;
+    до первой проверки и когда здоровых нет, чтение идет в primary.
+    Реплика, оборвавшая соединение посреди запроса, выбывает сразу, не дожидаясь проверки
+    """
+    def __init__(self):
+        self.replicas: list[Replica] = []
+        self.primary: AsyncEngine | None = None
+        self.max_lag = 0.0
+        self.interval = 0.0
+        self.fallbacks = 0
+        self.failovers = 0
+        self._next = 0
+        self._task: asyncio.Task | None = None
+
+    def configure(self, primary: AsyncEngine, engines: list[AsyncEngine], max_lag: float, interval: float) -> None:
+        self.primary = primary
+        self.replicas = [Replica(f"replica-{i}", engine, self) for i, engine in enumerate(engines, 1)]
+        self.max_lag = max_lag
+        self.interval = interval
+
+    def healthy(self, replica: Replica) -> bool:
+        return replica.up and replica.lag is not None and replica.lag <= self.max_lag
+
+    def pick(self) -> Replica | None:
+        """Следующая здоровая реплика по кругу или None (тогда читать из primary)"""
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[self._next % len(self.replicas)]
+            self._next += 1
+            if self.healthy(replica):
+                replica.sessions += 1
+                return replica
+        if self.replicas:
+            self.fallbacks += 1
+        return None
+
+    def mark_down(self, replica: Replica, error: Exception) -> None:
+        """Реплика упала посреди запроса: не выдавать ее до следующей успешной проверки"""
+        error = str(error).strip().split("\n")[0] or type(error).__name__
+        if replica.up:
+            logger.warning("replica %s failed mid-request, reading from primary: %s", replica.name, error)
+        replica.up = False
+        replica.error = error
+        self.failovers += 1
+
+    async def _check_one(self, replica: Replica) -> None:
+        async def measure() -> float:
+            async with replica.engine.connect() as connection:
+                return float(await connection.scalar(LAG_SQL))
+
+        try:
+            replica.lag = await asyncio.wait_for(measure(), self.interval or None)
+            replica.up = True
+            replica.error = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = str(e).strip().split("\n")[0] or type(e).__name__
+            if replica.up:
+                logger.warning("replica %s is down: %s", replica.name, error)
+            replica.up = False
+            replica.error = error
+        replica.checked_at = time.time()
+
+    async def check(self) -> None:
+        """Проверить все реплики одновременно"""
+        await asyncio.gather(*(self._check_one(replica) for replica in self.replicas))
+
+    async def start(self) -> None:
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._check_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def dispose(self) -> None:
+        for replica in self.replicas:
+            await replica.engine.dispose()
+        self.replicas = []
+        self.primary = None
+
+    async def _check_forever(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "max_lag_s": self.max_lag,
+            "fallbacks": self.fallbacks,
+            "failovers": self.failovers,
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": self.healthy(replica),
+                    "up": replica.up,
+                    "lag_s": replica.lag,
+                    "sessions": replica.sessions,
+                    "checked_at": replica.checked_at,
+                    "error": replica.error,
+                }
+                for replica in self.replicas
+            ],
+        }
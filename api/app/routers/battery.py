@@ -1,16 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+import asyncio
 
-from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import Response, StreamingResponse
+
+from typing import List, Literal, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_async_session
-from app.schemas.battery import Battery, BatteryCreate, BatteryList, BatteryUpdate, BatteryPatch, BatteryResponse
-from app.crud.battery import BatteryCRUD
+from app.database import get_async_session, is_replica
+from app.schemas.battery import (
+    Battery, BatteryCreate, BatteryFilter, BatteryList, BatteryUpdate, BatteryPatch, BatteryResponse, BatterySortField,
+    BatteryBulkCreate, BatteryBulkResponse, BatteryReassign, BatteryReassignResponse, BatteryBatchResponse
+)
+from app.schemas.common import BatchGet, CountMode, SortOrder, parse_fields
+from app.crud.battery import LOW_CAPACITY_THRESHOLD, BatteryCRUD, in_alert
+from app.services.stats import stats_cache
+from app.services.export import EXPORT_MEDIA_TYPES, export_headers, render_export
+from app.services.cache import battery_cache
+from app.services.etag import etag_matches, make_etag, not_modified
+from app.services.alerts import alert_broadcaster
+from app.services.alert_sets import alert_sets
+from app.services.fast_json import FastJSONResponse, dump_json, fast_json, fast_json_list, pick
+from app.config import settings
 
 
 router= APIRouter()
 
-router.post(
+def battery_filters(
+    device_id: Optional[int]=Query(None, description="Только батареи устройства"),
+    nominal_voltage: Optional[float]=Query(None, gt=0, description="Номинальное напряжение"),
+    min_capacity: Optional[float]=Query(None, ge=0, le=100, description="Остаточная емкость от, %"),
+    max_capacity: Optional[float]=Query(None, ge=0, le=100, description="Остаточная емкость до, %"),
+    min_service_life: Optional[int]=Query(None, ge=0, description="Срок службы от, дней"),
+    max_service_life: Optional[int]=Query(None, ge=0, description="Срок службы до, дней"),
+) -> BatteryFilter:
+    """Фильтры списка и выгрузки батарей из query-параметров"""
+    if min_capacity is not None and max_capacity is not None and min_capacity > max_capacity:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_capacity must not exceed max_capacity"
+        )
+    if min_service_life is not None and max_service_life is not None and min_service_life > max_service_life:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_service_life must not exceed max_service_life"
+        )
+    return BatteryFilter(
+        device_id=device_id,
+        nominal_voltage=nominal_voltage,
+        min_capacity=min_capacity,
+        max_capacity=max_capacity,
+        min_service_life=min_service_life,
+        max_service_life=max_service_life
+    )
+
+@router.post(
     "/",
     response_model=BatteryResponse,
     status_code=status.HTTP_201_CREATED,
@@ -25,16 +68,90 @@ async def create_battery(
 
     try:
         new_battery=await crud.create(battery)
-        return BatteryResponse(
-            success=True,
-            data=new_battery,
-            message="Battery created successfully"
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
-    except Exception as e:
+    return BatteryResponse(
+        success=True,
+        data=new_battery,
+        message="Battery created successfully"
+    )
+    
+@router.post(
+    "/bulk",
+    response_model=BatteryBulkResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Массово создать батареи",
+    description="Создает до 10000 батарей за один запрос. В режиме atomic любая ошибка отменяет всю пачку, в режиме partial создаются только корректные элементы"
+)
+async def bulk_create_batteries(
+    payload: BatteryBulkCreate,
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=BatteryCRUD(db)
+
+    try:
+        ids, errors=await crud.bulk_create(payload.items, partial=payload.mode == "partial")
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+
+    if errors and payload.mode == "atomic":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "message": "Batch rejected, no batteries were created",
+                "errors": errors
+            }
+        )
+    return BatteryBulkResponse(
+        success=not errors,
+        created=len(ids),
+        ids=ids,
+        errors=errors,
+        message=f"Created {len(ids)} of {len(payload.items)} batteries"
+    )
+    
+@router.post(
+    "/reassign",
+    response_model=BatteryReassignResponse,
+    summary="Массово переподключить батареи",
+    description="Переносит батареи по списку пар (battery_id, device_id) или все батареи одного устройства на другое. Лимит в 5 батарей проверяется для всех устройств сразу, переносы применяются одной транзакцией"
+)
+async def reassign_batteries(
+    payload: BatteryReassign,
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=BatteryCRUD(db)
+
+    moves=[(move.battery_id, move.device_id) for move in payload.moves] if payload.moves else None
+    try:
+        ids, errors=await crud.reassign_many(moves, payload.from_device_id, payload.to_device_id, partial=payload.mode == "partial")
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+
+    if errors and payload.mode == "atomic":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={
+                "message": "Batch rejected, no batteries were moved",
+                "errors": errors
+            }
+        )
+    return BatteryReassignResponse(
+        success=not errors,
+        moved=len(ids),
+        ids=ids,
+        errors=errors,
+        message=f"Moved {len(ids)} batteries"
+    )
     
 @router.get(
     "/",
@@ -43,18 +160,110 @@ async def create_battery(
     description="Возвращает список всех батарей"
 )
 async def read_batteries(
-    skip: int=Query(0, ge=0, description="Количество пропущенных записей"),
+    response: Response,
+    skip: int=Query(0, ge=0, description="Количество пропущенных записей (режим совместимости, игнорируется при cursor)"),
     limit: int=Query(100, ge=1, le=1000, description="Лимит записей"),
+    cursor: Optional[str]=Query(None, description="Курсор следующей страницы из next_cursor"),
+    sort_by: BatterySortField=Query("id", description="Поле сортировки"),
+    order: SortOrder=Query("asc", description="Направление сортировки"),
+    count: CountMode=Query("exact", description="Подсчет total: exact, estimated или none"),
+    filters: BatteryFilter=Depends(battery_filters),
+    fields: Optional[str]=Query(None, description="Только эти поля через запятую, например name,residual_capacity (id есть всегда)"),
+    if_none_match: Optional[str]=Header(None),
     db: AsyncSession=Depends(get_async_session)
 ):
     crud=BatteryCRUD(db)
 
-    batteries=await crud.get_all()
-    return BatteryList(
-        devices=batteries[skip:skip+limit],
-        total=len(batteries),
+    try:
+        selected=parse_fields(fields, Battery.model_fields)
+        total=await crud.count(count, filters)
+        #Условный запрос проверяем по версиям строк страницы до загрузки самих батарей
+        if if_none_match:
+            etag=_fields_etag(await crud.page_etag(limit, skip, cursor, sort_by, order, total, filters), selected)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+        batteries, next_cursor, versions=await crud.get_page(limit, skip, cursor, sort_by, order, filters, selected)
+        etag=_fields_etag(crud.list_etag(versions, total), selected)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    response.headers["ETag"]=etag
+    page=dict(
+        devices=batteries,
+        total=total,
         skip=skip,
-        limit=limit
+        limit=limit,
+        next_cursor=next_cursor
+    )
+    if selected is not None:
+        #Выборочные поля не проходят через схему ответа
+        page["devices"]=[pick(row, selected) for row in batteries]
+        return FastJSONResponse(page, headers={"ETag": etag})
+    if settings.FAST_JSON_RESPONSES:
+        return fast_json(BatteryList, page, response)
+    return BatteryList(**page)
+
+def _fields_etag(etag: str, selected: tuple[str, ...] | None) -> str:
+    """ETag страницы с учетом ?fields="""
+    return etag if selected is None else make_etag("fields", etag, selected)
+
+@router.post(
+    "/batch-get",
+    response_model=BatteryBatchResponse,
+    summary="Получить несколько батарей по id",
+    description="Возвращает батареи по списку id в том же порядке. Для ненайденных id found=false"
+)
+async def batch_get_batteries(
+    payload: BatchGet,
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=BatteryCRUD(db)
+    found=await crud.get_many(payload.ids)
+    result=dict(
+        success=len(found) == len(set(payload.ids)),
+        items=[dict(id=battery_id, found=battery_id in found, data=found.get(battery_id)) for battery_id in payload.ids],
+        missing=[battery_id for battery_id in dict.fromkeys(payload.ids) if battery_id not in found]
+    )
+    if settings.FAST_JSON_RESPONSES:
+        return fast_json(BatteryBatchResponse, result)
+    return BatteryBatchResponse(**result)
+
+@router.get(
+    "/search",
+    response_model=List[Battery],
+    summary="Поиск батарей по имени",
+    description="Ищет батареи по части имени (от 3 символов - подстрока и опечатки через pg_trgm, короче - префикс). Результаты отсортированы по релевантности"
+)
+async def search_batteries(
+    q: str=Query(..., min_length=1, max_length=100, description="Часть имени"),
+    limit: int=Query(20, ge=1, le=100, description="Максимальное количество результатов"),
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=BatteryCRUD(db)
+    batteries=await crud.search(q, limit)
+    if settings.FAST_JSON_RESPONSES:
+        return fast_json_list(Battery, batteries)
+    return batteries
+
+@router.get(
+    "/export",
+    summary="Выгрузить все батарей",
+    description="Потоково выгружает батарей в NDJSON или CSV. Память процесса не зависит от размера таблицы",
+    response_class=StreamingResponse
+)
+async def export_batteries(
+    format: Literal["ndjson", "csv"]=Query("ndjson", description="Формат выгрузки"),
+    chunk_size: int=Query(1000, ge=100, le=10000, description="Размер пачки, читаемой из курсора"),
+    filters: BatteryFilter=Depends(battery_filters),
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=BatteryCRUD(db)
+    return StreamingResponse(
+        render_export(crud.stream_export(chunk_size, filters), [c.key for c in crud.EXPORT_COLUMNS], format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers=export_headers("batteries", format)
     )
 
 @router.get(
@@ -65,21 +274,75 @@ async def read_batteries(
 )
 async def read_battery(
     battery_id: int,
+    fields: Optional[str]=Query(None, description="Только эти поля через запятую (id есть всегда)"),
+    if_none_match: Optional[str]=Header(None),
     db: AsyncSession= Depends(get_async_session)
 ):
-    crud=BatteryCRUD(db)
-    battery=await crud.get(battery_id)
+    if fields is not None:
+        return await _read_battery_fields(BatteryCRUD(db), battery_id, fields, if_none_match)
 
-    if not battery:
+    #Готовый JSON из кэша отдается без запроса к базе и без pydantic
+    cached=battery_cache.get(battery_id)
+    if cached is not None and settings.RESPONSE_CACHE_VALIDATE:
+        #Запись могли изменить в другом процессе, не сбросив этот кэш: сверяем ETag с базой
+        if await BatteryCRUD(db).get_etag(battery_id)!=cached[0]:
+            cached=None
+    if cached is None:
+        crud=BatteryCRUD(db)
+        #Условный запрос проверяем одним запросом по первичному ключу, не строя ORM-объекты
+        if if_none_match:
+            etag=await crud.get_etag(battery_id)
+            if etag is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Battery not found"
+                )
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+
+        token=battery_cache.reserve(battery_id)
+        battery=await crud.get(battery_id)
+        if not battery:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Battery not found"
+            )
+        if settings.FAST_JSON_RESPONSES:
+            payload=dump_json(BatteryResponse, {"success": True, "data": battery})
+        else:
+            payload=BatteryResponse(
+                success=True,
+                data=battery
+            ).model_dump_json().encode()
+        cached=(crud.etag_for(battery), payload)
+        #Ответ реплики может отставать от записи, которая только что сбросила кэш, - его не кэшируем
+        if not is_replica(db):
+            battery_cache.set(battery_id, cached, token)
+
+    etag, payload=cached
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return Response(content=payload, media_type="application/json", headers={"ETag": etag})
+
+async def _read_battery_fields(crud: BatteryCRUD, battery_id: int, fields: str, if_none_match: Optional[str]):
+    """Батарея с выборочными полями: один запрос только нужных колонок, мимо кэша ответов"""
+    try:
+        selected=parse_fields(fields, Battery.model_fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    row=await crud.get_row(battery_id, selected)
+    if row is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Battery not found"
         )
-    
-    return BatteryResponse(
-        success=True,
-        data=battery
-    )
+    etag=make_etag("battery", row["version"], selected)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return FastJSONResponse({"success": True, "data": pick(row, selected), "message": ""}, headers={"ETag": etag})
 
 @router.put(
     "/{battery_id}",
@@ -96,21 +359,21 @@ async def update_battery(
 
     try:
         battery=await crud.update(battery_id, battery_update)
-        if not battery:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Battery not found"
-            )
-        return BatteryResponse(
-            success=True,
-            data=battery,
-            message="Battery updated successfully"
-        )
-    except Exception as e:
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    if not battery:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Battery not found"
+        )
+    return BatteryResponse(
+        success=True,
+        data=battery,
+        message="Battery updated successfully"
+    )
 
 @router.patch(
     "/{battery_id}",
@@ -126,21 +389,21 @@ async def patch_battery(
     crud=BatteryCRUD(db)
     try:
         battery=await crud.patch(battery_id, battery_patch)
-        if not battery:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Battery not found"
-            )
-        return BatteryResponse(
-            success=True,
-            data=battery,
-            message="Battery patched successfully"
-        )
-    except Exception as e:
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    if not battery:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Battery not found"
+        )
+    return BatteryResponse(
+        success=True,
+        data=battery,
+        message="Battery patched successfully"
+    )
 
 @router.delete(
     "/{battery_id}",
@@ -179,47 +442,56 @@ async def ressign_battery(
 
     try:
         battery=await crud.reassign_battery(battery_id, device_id)
-        if not battery:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Battery not found"
-            )
-        return BatteryResponse(
-            success=True,
-            data=battery,
-            message="Battery ressigned successfylly"
-        )
-    except Exception as e:
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    if not battery:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Battery not found"
+        )
+    return BatteryResponse(
+        success=True,
+        data=battery,
+        message="Battery ressigned successfylly"
+    )
     
 @router.get(
     "/stats/summary",
     response_model=dict,
     summary="Статистка по батареям",
-    description="Возвращает общую статистку по батареям"
+    description="Возвращает общую статистку по батареям (кэшируется на STATS_CACHE_TTL секунд)"
 )
 async def get_battery_stats(
     db: AsyncSession=Depends(get_async_session)
 ):
     crud=BatteryCRUD(db)
-    stats=await crud.get_battery_stats()
+    #Статистика, посчитанная на реплике, может не учитывать последние изменения - ее не кэшируем
+    stats=await stats_cache.get(crud.get_battery_stats, store=not is_replica(db))
     return stats
 
 @router.get(
     "/alerts/low_capacity",
     response_model=List[Battery],
     summary="Батареи с низкой емкостью",
-    description="Возвращает батарею с остаточной емкастью ниже указанного порога"
+    description="Возвращает батарею с остаточной емкастью ниже указанного порога. "
+                "Для порога по умолчанию id берутся из множества алерта в памяти"
 )
 async def get_low_capacity_batteries(
-    threshold: float = Query(20.0, ge=0, le=100, description="Порог емкости в процентах"),
+    threshold: float = Query(LOW_CAPACITY_THRESHOLD, ge=0, le=100, description="Порог емкости в процентах"),
+    limit: int=Query(100, ge=1, le=1000, description="Лимит записей"),
     db: AsyncSession=Depends(get_async_session)
 ):
     crud=BatteryCRUD(db)
-    batteries=await crud.get_low_capacity_batteries(threshold)
+    batteries=None
+    if threshold == LOW_CAPACITY_THRESHOLD and alert_sets.ready:
+        batteries=await _alert_batteries(crud, "low_capacity", limit)
+    if batteries is None:
+        batteries=await crud.get_low_capacity_batteries(threshold, limit)
+    if settings.FAST_JSON_RESPONSES:
+        return fast_json_list(Battery, batteries)
     return batteries
 
 @router.get(
@@ -229,8 +501,74 @@ async def get_low_capacity_batteries(
     description="Возвращает батареи которые требуют замены"
 )
 async def get_need_replacement_batteries(
+    limit: int=Query(100, ge=1, le=1000, description="Лимит записей"),
     db: AsyncSession=Depends(get_async_session)
 ):
     crud=BatteryCRUD(db)
-    batteries=await crud.get_need_replacement_batteries()
-    return batteries
\ No newline at end of file
+    batteries=None
+    if alert_sets.ready:
+        batteries=await _alert_batteries(crud, "need_replacement", limit)
+    if batteries is None:
+        batteries=await crud.get_need_replacement_batteries(limit)
+    if settings.FAST_JSON_RESPONSES:
+        return fast_json_list(Battery, batteries)
+    return batteries
+
+async def _alert_batteries(crud: BatteryCRUD, alert: str, limit: int) -> list | None:
+    """
+    Батареи алерта по id из памяти: один запрос по первичному ключу.
+    None - множество в памяти отстало от базы, читать алерт запросом
+    """
+    ids=alert_sets.ids(alert, limit)
+    if not ids:
+        return []
+    found=await crud.get_many(ids)
+    batteries=[found[battery_id] for battery_id in ids if battery_id in found and in_alert(alert, found[battery_id])]
+    #Батарея могла выйти из алерта или удалиться до прихода события: без нее страница была бы неполной
+    if len(batteries) < len(ids):
+        return None
+    return batteries
+
+@router.get(
+    "/alerts/stream",
+    summary="Поток алертов (SSE)",
+    description="Server-Sent Events: событие alert, когда батарея входит в алерт low_capacity/need_replacement "
+                "или выходит из него (active), и resync после переподключения к базе"
+)
+async def stream_alerts():
+    #Без сессии: поток живет долго и не должен держать соединение из пула
+    if not settings.ALERT_STREAM_ENABLED:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Alert stream is disabled")
+    return StreamingResponse(
+        alert_broadcaster.sse(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/alerts/ws")
+async def alerts_websocket(websocket: WebSocket):
+    """Те же события, что и /alerts/stream, сообщениями {"type": ..., ...}"""
+    if not settings.ALERT_STREAM_ENABLED:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+    await websocket.accept()
+    async with alert_broadcaster.subscribe() as queue:
+        #Входящие сообщения не нужны, ждем только отключения клиента
+        closed = asyncio.create_task(_wait_disconnect(websocket))
+        try:
+            while True:
+                event = asyncio.create_task(queue.get())
+                await asyncio.wait({event, closed}, return_when=asyncio.FIRST_COMPLETED)
+                if closed.done():
+                    event.cancel()
+                    break
+                kind, data = event.result()
+                await websocket.send_json({"type": kind, **data})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            closed.cancel()
+
+async def _wait_disconnect(websocket: WebSocket):
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
@@ -1,16 +1,46 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import List, Literal, Optional, Union
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import Response, StreamingResponse
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import get_async_session
-from app.schemas.device import Device, DeviceCreate, DevicePatch, DeviceUpdate, DeviceList, DeviceResponse
+from app.database import get_async_session, is_replica
+from app.schemas.device import (
+    Device, DeviceCreate, DeviceFilter, DevicePatch, DeviceUpdate, DeviceList, DeviceResponse, DeviceSortField,
+    DeviceBatchResponse, DeviceSummary, DeviceSummaryList, DeviceView
+)
+from app.schemas.common import BatchGet, CountMode, SortOrder, parse_fields
 from app.schemas.battery import Battery, BatteryCreate
 from app.crud.device import DeviceCRUD
 from app.crud.battery import BatteryCRUD
+from app.crud.errors import NotFoundError
+from app.services.export import EXPORT_MEDIA_TYPES, export_headers, render_export
+from app.services.cache import device_cache
+from app.services.etag import etag_matches, make_etag, not_modified
+from app.services.fast_json import FastJSONResponse, dump_json, fast_json, fast_json_list, pick
+from app.config import settings
 
 router= APIRouter()
 
+def device_filters(
+    is_active: Optional[bool]=Query(None, description="Только включенные или только выключенные"),
+    firmware_version: Optional[str]=Query(None, max_length=50, description="Версия прошивки"),
+    min_batteries: Optional[int]=Query(None, ge=0, le=5, description="Батарей не меньше"),
+    max_batteries: Optional[int]=Query(None, ge=0, le=5, description="Батарей не больше"),
+) -> DeviceFilter:
+    """Фильтры списка и выгрузки устройств из query-параметров"""
+    if min_batteries is not None and max_batteries is not None and min_batteries > max_batteries:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_batteries must not exceed max_batteries"
+        )
+    return DeviceFilter(
+        is_active=is_active,
+        firmware_version=firmware_version,
+        min_batteries=min_batteries,
+        max_batteries=max_batteries
+    )
+
 @router.post(
     "/",
     response_model=DeviceResponse,
@@ -23,46 +53,137 @@ async def create_device(
     db:AsyncSession=Depends(get_async_session)
 ):
     crud=DeviceCRUD(db)
-    
-    #Проверка на уникальность имени
-    existing_device= await crud.get_by_name(device.name)
-    if existing_device:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Device with this name already exists"
-        )
-    
+
+    #Уникальность имени проверяет ограничение в базе, отдельный запрос не нужен
     try:
         new_device=await crud.create(device)
-        return DeviceResponse(
-            success=True,
-            data=new_device,
-            message="Device created successfully"
-        )
-    except Exception as e:
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    return DeviceResponse(
+        success=True,
+        data=new_device,
+        message="Device created successfully"
+    )
 
 @router.get(
     "/",
-    response_model=DeviceList,
+    response_model=Union[DeviceList, DeviceSummaryList],
     summary="Получить все устройства",
-    description="Возвращает список всех устройств"
+    description="Возвращает список всех устройств. view=summary - без батарей, с их количеством и емкостью (DeviceSummaryList)"
 )
 async def read_devices(
-    skip: int = Query(0, ge=0, description="Количество пропущенных записей"),
+    response: Response,
+    skip: int = Query(0, ge=0, description="Количество пропущенных записей (режим совместимости, игнорируется при cursor)"),
     limit: int = Query(100, ge=1, le=1000, description="Максимальное количество записей"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из next_cursor"),
+    sort_by: DeviceSortField = Query("id", description="Поле сортировки"),
+    order: SortOrder = Query("asc", description="Направление сортировки"),
+    count: CountMode = Query("exact", description="Подсчет total: exact, estimated или none"),
+    filters: DeviceFilter = Depends(device_filters),
+    view: DeviceView = Query("full", description="full - с батареями, summary - только количество и емкость батарей"),
+    fields: Optional[str] = Query(None, description="Только эти поля через запятую, например name,is_active (id есть всегда)"),
+    if_none_match: Optional[str] = Header(None),
     db: AsyncSession=Depends(get_async_session)
 ):
     crud=DeviceCRUD(db)
-    devices=await crud.get_all()
-    return DeviceList(
-        devices=devices[skip:skip+limit],
-        total=len(devices),
+    try:
+        selected=parse_fields(fields, DeviceSummary.model_fields if view == "summary" else Device.model_fields)
+        total=await crud.count(count, filters)
+        #Условный запрос проверяем по версиям строк страницы до загрузки самих устройств
+        if if_none_match:
+            etag=await crud.page_etag(limit, skip, cursor, sort_by, order, total, filters, crud.shows_batteries(view, selected))
+            etag=_view_etag(etag, view, selected)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+        devices, next_cursor, versions=await crud.get_page(limit, skip, cursor, sort_by, order, filters, selected, view)
+        etag=_view_etag(crud.list_etag(versions, total), view, selected)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    response.headers["ETag"]=etag
+    page=dict(
+        devices=devices,
+        total=total,
         skip=skip,
-        limit=limit
+        limit=limit,
+        next_cursor=next_cursor
+    )
+    if view == "summary" and selected is None:
+        return fast_json(DeviceSummaryList, page, response)
+    if selected is not None:
+        #Выборочные поля не проходят через схему ответа
+        page["devices"]=[pick(row, selected) for row in devices]
+        return FastJSONResponse(page, headers={"ETag": etag})
+    if settings.FAST_JSON_RESPONSES:
+        return fast_json(DeviceList, page, response)
+    return DeviceList(**page)
+
+def _view_etag(etag: str, view: str, selected: tuple[str, ...] | None) -> str:
+    """ETag страницы с учетом view и ?fields="""
+    if view != "full" or selected is not None:
+        return make_etag("fields", etag, view, selected)
+    return etag
+
+@router.post(
+    "/batch-get",
+    response_model=DeviceBatchResponse,
+    summary="Получить несколько устройств по id",
+    description="Возвращает устройства по списку id в том же порядке. Для ненайденных id found=false"
+)
+async def batch_get_devices(
+    payload: BatchGet,
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=DeviceCRUD(db)
+    found=await crud.get_many(payload.ids)
+    result=dict(
+        success=len(found) == len(set(payload.ids)),
+        items=[dict(id=device_id, found=device_id in found, data=found.get(device_id)) for device_id in payload.ids],
+        missing=[device_id for device_id in dict.fromkeys(payload.ids) if device_id not in found]
+    )
+    if settings.FAST_JSON_RESPONSES:
+        return fast_json(DeviceBatchResponse, result)
+    return DeviceBatchResponse(**result)
+
+@router.get(
+    "/search",
+    response_model=List[Device],
+    summary="Поиск устройств по имени",
+    description="Ищет устройства по части имени (от 3 символов - подстрока и опечатки через pg_trgm, короче - префикс). Результаты отсортированы по релевантности"
+)
+async def search_devices(
+    q: str=Query(..., min_length=1, max_length=100, description="Часть имени"),
+    limit: int=Query(20, ge=1, le=100, description="Максимальное количество результатов"),
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=DeviceCRUD(db)
+    devices=await crud.search(q, limit)
+    if settings.FAST_JSON_RESPONSES:
+        return fast_json_list(Device, devices)
+    return devices
+
+@router.get(
+    "/export",
+    summary="Выгрузить все устройств",
+    description="Потоково выгружает устройств в NDJSON или CSV. Память процесса не зависит от размера таблицы",
+    response_class=StreamingResponse
+)
+async def export_devices(
+    format: Literal["ndjson", "csv"]=Query("ndjson", description="Формат выгрузки"),
+    chunk_size: int=Query(1000, ge=100, le=10000, description="Размер пачки, читаемой из курсора"),
+    filters: DeviceFilter=Depends(device_filters),
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=DeviceCRUD(db)
+    return StreamingResponse(
+        render_export(crud.stream_export(chunk_size, filters), [c.key for c in crud.EXPORT_COLUMNS], format),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers=export_headers("devices", format)
     )
 
 @router.get(
@@ -73,19 +194,81 @@ async def read_devices(
 )
 async def read_device(
     device_id:int,
+    fields: Optional[str]=Query(None, description="Только эти поля через запятую (id есть всегда)"),
+    if_none_match: Optional[str]=Header(None),
     db: AsyncSession=Depends(get_async_session)
 ):
-    crud=DeviceCRUD(db)
-    device=await crud.get(device_id)
-    if not device:
+    if fields is not None:
+        return await _read_device_fields(DeviceCRUD(db), device_id, fields, if_none_match)
+
+    #Готовый JSON из кэша отдается без запроса к базе и без pydantic
+    cached=device_cache.get(device_id)
+    if cached is not None and settings.RESPONSE_CACHE_VALIDATE:
+        #Запись могли изменить в другом процессе, не сбросив этот кэш: сверяем ETag с базой
+        if await DeviceCRUD(db).get_etag(device_id)!=cached[0]:
+            cached=None
+    if cached is None:
+        crud=DeviceCRUD(db)
+        #Условный запрос проверяем одним индексным запросом, не строя ORM-объекты
+        if if_none_match:
+            etag=await crud.get_etag(device_id)
+            if etag is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Device not found"
+                )
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+
+        token=device_cache.reserve(device_id)
+        device=await crud.get(device_id)
+        if not device:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Device not found"
+            )
+        if settings.FAST_JSON_RESPONSES:
+            payload=dump_json(DeviceResponse, {"success": True, "data": device})
+        else:
+            payload=DeviceResponse(
+                success=True,
+                data=device
+            ).model_dump_json().encode()
+        cached=(crud.etag_for(device), payload)
+        #Ответ реплики может отставать от записи, которая только что сбросила кэш, - его не кэшируем
+        if not is_replica(db):
+            device_cache.set(device_id, cached, token)
+
+    etag, payload=cached
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return Response(content=payload, media_type="application/json", headers={"ETag": etag})
+
+async def _read_device_fields(crud: DeviceCRUD, device_id: int, fields: str, if_none_match: Optional[str]):
+    """Устройство с выборочными полями: только нужные колонки, батареи - только если они запрошены"""
+    try:
+        selected=parse_fields(fields, Device.model_fields)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    base=await crud.get_etag(device_id)
+    if base is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Device not found"
         )
-    return DeviceResponse(
-        success=True,
-        data=device
-    )
+    etag=make_etag("fields", base, selected)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    row=await crud.get_row(device_id, selected)
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device not found"
+        )
+    return FastJSONResponse({"success": True, "data": pick(row, selected), "message": ""}, headers={"ETag": etag})
 
 
 @router.put(
@@ -101,33 +284,24 @@ async def update_device(
 ):
     crud=DeviceCRUD(db)
 
-    #Проверка на уникальность имени
-    existing_device= await crud.get_by_name(device_update.name)
-    if existing_device and existing_device.id != device_id:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Device with this name already exists"
-        )
-    
     try:
         #Если устройства с такими id не существует вернет None
         device= await crud.update(device_id, device_update)
-        if not device:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Device not found"
-            )
-        
-        return DeviceResponse(
-            success=True,
-            data=device,
-            message="Device updated successfully"
-        )
-    except Exception as e:
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    if not device:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device not found"
+        )
+    return DeviceResponse(
+        success=True,
+        data=device,
+        message="Device updated successfully"
+    )
 
 @router.patch(
     "/{device_id}",
@@ -142,32 +316,23 @@ async def patch_device(
 ):
     crud=DeviceCRUD(db)
 
-    #При patch имя может быть не указано поэтому проверяем на уникальность имени только если оно существует
-    if device_patch.name:
-        existing_device= await crud.get_by_name(device_patch.name)
-        if existing_device and existing_device.id != device_id:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Device with this name already exists"
-            )
-        
     try:
         device=await crud.patch(device_id, device_patch)
-        if not device:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Device not found"
-            )
-        return DeviceResponse(
-            success=True,
-            data=device,
-            message="Device patched successfully"
-        )
-    except Exception as e:
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+    if not device:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Device not found"
+        )
+    return DeviceResponse(
+        success=True,
+        data=device,
+        message="Device patched successfully"
+    )
 
 @router.delete(
     "/{device_id}",
@@ -207,29 +372,27 @@ async def add_battery_to_device(
     device_crud=DeviceCRUD(db)
     battery_crud=BatteryCRUD(db)
 
-    #Поверяем существование устройства
-    device=await device_crud.get(device_id)
-    if not device:
+    #Существование устройства и лимит батарей проверяются в самом INSERT
+    try:
+        battery.device_id=device_id
+        await battery_crud.create(battery)
+    except NotFoundError:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Device not found"
         )
-    
-    try:
-        battery.device_id=device_id
-        new_battery=await battery_crud.create(battery)
-        
-        update_device=await device_crud.get(device_id)
-        return DeviceResponse(
-            success=True,
-            data=update_device,
-            message="Battery added to device success"
-        )
-    except Exception as e:
+    except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
         )
+
+    update_device=await device_crud.get(device_id)
+    return DeviceResponse(
+        success=True,
+        data=update_device,
+        message="Battery added to device success"
+    )
     
 @router.get(
     "/{device_id}/batteries",
@@ -243,6 +406,8 @@ async def get_device_batteries(
 ):
     battery_crud=BatteryCRUD(db)
     batteries=await battery_crud.get_by_device(device_id)
+    if settings.FAST_JSON_RESPONSES:
+        return fast_json_list(Battery, batteries)
     return batteries
 
 @router.delete(
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Response, status
+
+from app.config import settings
+from app.database import ping
+from app.services.warmup import warmup
+
+
+router= APIRouter()
+
+@router.get(
+    "",
+    summary="Проверка работы API",
+    description="То же, что /health/live"
+)
+@router.get(
+    "/live",
+    summary="Процесс жив",
+    description="Процесс запущен и отвечает на запросы. База не проверяется"
+)
+async def liveness():
+    return {"status": "healthy"}
+
+@router.get(
+    "/ready",
+    summary="Готовность принимать трафик",
+    description="Проверяет соединение с базой и прогрев пула текущего процесса. "
+                "Пока прогрев не закончен или база не отвечает, возвращает 503"
+)
+async def readiness(response: Response):
+    try:
+        database={"ok": True, "latency_ms": round(await ping(settings.HEALTH_DB_TIMEOUT) * 1000, 2)}
+    except Exception as e:
+        database={"ok": False, "error": str(e) or type(e).__name__}
+    ready=warmup.done and database["ok"]
+    if not ready:
+        response.status_code=status.HTTP_503_SERVICE_UNAVAILABLE
+    return {
+        "status": "ready" if ready else "not_ready",
+        "database": database,
+        "warmup": warmup.stats()
+    }
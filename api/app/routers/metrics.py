@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+
+from app.database import get_engine, replicas
+from app.services.cache import battery_cache, device_cache
+from app.services.alerts import alert_broadcaster
+from app.services.alert_sets import alert_sets
+
+
+router= APIRouter()
+
+@router.get(
+    "/cache",
+    summary="Статистика кэша ответов",
+    description="Возвращает счетчики попаданий, промахов и вытеснений кэшей устройств и батарей текущего процесса"
+)
+async def cache_metrics():
+    return {
+        "devices": device_cache.stats(),
+        "batteries": battery_cache.stats()
+    }
+
+@router.get(
+    "/db-pool",
+    summary="Состояние пула соединений",
+    description="Возвращает занятые соединения, overflow, время ожидания соединения и число таймаутов выдачи в текущем процессе"
+)
+async def db_pool_metrics():
+    return get_engine().pool.metrics()
+
+@router.get(
+    "/db-replicas",
+    summary="Состояние реплик для чтения",
+    description="Возвращает доступность и задержку каждой реплики, число выданных ей сессий "
+                "и сколько чтений ушло в primary, потому что здоровых реплик не было"
+)
+async def db_replica_metrics():
+    return replicas.stats()
+
+@router.get(
+    "/alerts",
+    summary="Состояние потока алертов",
+    description="Возвращает состояние LISTEN-соединения, число подписчиков, разосланных и потерянных событий "
+                "и размеры множеств алертов в памяти текущего процесса"
+)
+async def alert_stream_metrics():
+    return {
+        **alert_broadcaster.stats(),
+        "sets": alert_sets.stats()
+    }
@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database import get_async_session
+from app.schemas.reading import Reading, ReadingBatch, ReadingBatchResponse
+from app.crud.reading import ReadingCRUD
+
+
+router= APIRouter()
+
+@router.post(
+    "/",
+    response_model=ReadingBatchResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Записать показания телеметрии",
+    description="Принимает пачку показаний батарей, сохраняет историю и обновляет текущую емкость батарей"
+)
+async def ingest_readings(
+    batch: ReadingBatch,
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=ReadingCRUD(db)
+    accepted, rejected=await crud.ingest(batch.readings)
+    return ReadingBatchResponse(
+        success=not rejected,
+        accepted=accepted,
+        rejected=rejected,
+        message=f"Stored {accepted} of {len(batch.readings)} readings"
+    )
+
+@router.get(
+    "/{battery_id}",
+    response_model=List[Reading],
+    summary="История показаний батареи",
+    description="Возвращает показания батареи за период, новые первыми"
+)
+async def read_battery_readings(
+    battery_id: int,
+    since: Optional[datetime]=Query(None, description="Начало периода (включительно)"),
+    until: Optional[datetime]=Query(None, description="Конец периода (не включительно)"),
+    limit: int=Query(1000, ge=1, le=10000, description="Лимит записей"),
+    db: AsyncSession=Depends(get_async_session)
+):
+    crud=ReadingCRUD(db)
+    return await crud.get_by_battery(battery_id, since, until, limit)
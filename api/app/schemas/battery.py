@@ -1,7 +1,19 @@
-from pydantic import BaseModel, Field, field_validator, ConfigDict
-from typing import Optional, List, ClassVar
+from pydantic import BaseModel, Field, field_validator, model_validator, ConfigDict
+from typing import Optional, List, ClassVar, Literal
 import re
 
+#Поля, по которым можно сортировать список батарей
+BatterySortField = Literal["id", "name", "nominal_voltage", "residual_capacity", "service_life", "device_id"]
+
+class BatteryFilter(BaseModel):
+    """Фильтры списка и выгрузки батарей, переводятся в WHERE"""
+    device_id: Optional[int] = None
+    nominal_voltage: Optional[float] = None
+    min_capacity: Optional[float] = None
+    max_capacity: Optional[float] = None
+    min_service_life: Optional[int] = None
+    max_service_life: Optional[int] = None
+
 class BatteryBase(BaseModel):
     """Базовая схема для аккумуляторной батареи"""
     
@@ -175,11 +187,108 @@ class Battery(BatteryBase):
 #Для ответа списка батарей
 class BatteryList(BaseModel):
     devices: List[Battery]
-    total: int
+    total: Optional[int]
     skip: int = 0
     limit: int = 100
+    #Курсор следующей страницы, None если страница последняя
+    next_cursor: Optional[str] = None
 
 class BatteryResponse(BaseModel):
     success: Optional[bool]=True
     data: Optional[Battery]
-    message: Optional[str]=""
\ No newline at end of file
+    message: Optional[str]=""
+
+class BatteryBulkCreate(BaseModel):
+    """Схема для массового создания батарей"""
+    items: List[BatteryCreate] = Field(
+        ...,
+        min_length=1,
+        max_length=10000,
+        description="Batteries to create"
+    )
+    #atomic - все или ничего, partial - создаются только корректные элементы
+    mode: Literal["atomic", "partial"] = Field(
+        default="atomic",
+        description="atomic: reject the whole batch on any error, partial: create only valid items"
+    )
+
+
+class BatteryBulkError(BaseModel):
+    """Ошибка по одному элементу массового создания"""
+    index: int = Field(..., description="Position of the item in the request")
+    name: str = Field(..., description="Battery name from the item")
+    detail: str = Field(..., description="Why the item was rejected")
+
+
+class BatteryBulkResponse(BaseModel):
+    success: bool = True
+    created: int = 0
+    ids: List[int] = Field(default_factory=list, description="Ids of created batteries in request order")
+    errors: List[BatteryBulkError] = Field(default_factory=list)
+    message: Optional[str] = ""
+
+
+class BatteryMove(BaseModel):
+    """Перенос одной батареи на другое устройство"""
+    battery_id: int = Field(..., description="Battery to move")
+    device_id: int = Field(..., description="Target device")
+
+
+class BatteryReassign(BaseModel):
+    """
+    Схема для массового переподключения батарей.
+    Либо список пар moves, либо перенос всех батарей from_device_id -> to_device_id
+    """
+    moves: Optional[List[BatteryMove]] = Field(
+        None,
+        min_length=1,
+        max_length=10000,
+        description="Pairs (battery_id, device_id) to apply"
+    )
+    from_device_id: Optional[int] = Field(None, description="Move all batteries of this device...")
+    to_device_id: Optional[int] = Field(None, description="...to this device")
+    #atomic - все или ничего, partial - применяются только корректные пары
+    mode: Literal["atomic", "partial"] = Field(
+        default="atomic",
+        description="atomic: reject the whole batch on any error, partial: apply only valid moves"
+    )
+
+    @model_validator(mode="after")
+    def validate_form(self):
+        pair_form = self.moves is not None
+        device_form = self.from_device_id is not None or self.to_device_id is not None
+        if pair_form == device_form:
+            raise ValueError("Specify either moves or from_device_id and to_device_id")
+        if device_form and (self.from_device_id is None or self.to_device_id is None):
+            raise ValueError("Both from_device_id and to_device_id are required")
+        if device_form and self.from_device_id == self.to_device_id:
+            raise ValueError("from_device_id and to_device_id must differ")
+        return self
+
+
+class BatteryReassignError(BaseModel):
+    """Отклоненный перенос"""
+    battery_id: int
+    device_id: int
+    detail: str = Field(..., description="Why the move was rejected")
+
+
+class BatteryReassignResponse(BaseModel):
+    success: bool = True
+    moved: int = 0
+    ids: List[int] = Field(default_factory=list, description="Ids of moved batteries, including ones already on the target device")
+    errors: List[BatteryReassignError] = Field(default_factory=list)
+    message: Optional[str] = ""
+
+
+class BatteryBatchItem(BaseModel):
+    """Результат для одного запрошенного id: found=False и data=None, если батареи нет"""
+    id: int
+    found: bool
+    data: Optional[Battery] = None
+
+
+class BatteryBatchResponse(BaseModel):
+    success: bool = True
+    items: List[BatteryBatchItem] = Field(default_factory=list, description="Results in the requested order")
+    missing: List[int] = Field(default_factory=list, description="Requested ids that were not found")
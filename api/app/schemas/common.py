@@ -0,0 +1,34 @@
+from typing import Iterable, List, Literal
+
+from pydantic import BaseModel, Field
+
+#Направление сортировки списков
+SortOrder = Literal["asc", "desc"]
+
+#Способ подсчета total в списках: точный, оценка планировщика или без подсчета
+CountMode = Literal["exact", "estimated", "none"]
+
+
+def parse_fields(raw: str | None, allowed: Iterable[str]) -> tuple[str, ...] | None:
+    """
+    Разбор ?fields=a,b,c для выборочных полей ответа.
+    id добавляется всегда, порядок - как в схеме ответа. None - все поля
+    """
+    if raw is None:
+        return None
+    allowed = tuple(allowed)
+    requested = {name.strip() for name in raw.split(",") if name.strip()}
+    unknown = requested.difference(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}")
+    return tuple(name for name in allowed if name in requested or name == "id")
+
+
+class BatchGet(BaseModel):
+    """Запрос нескольких объектов по списку id"""
+    ids: List[int] = Field(
+        ...,
+        min_length=1,
+        max_length=1000,
+        description="Ids to fetch, results keep this order"
+    )
@@ -1,7 +1,20 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import List, Optional, ClassVar
+from typing import List, Optional, ClassVar, Literal
 from .battery import Battery
 
+#Поля, по которым можно сортировать список устройств
+DeviceSortField = Literal["id", "name", "firmware_version", "battery_count"]
+
+#Представление списка устройств: полное (с батареями) или сводка по батареям одним GROUP BY
+DeviceView = Literal["full", "summary"]
+
+class DeviceFilter(BaseModel):
+    """Фильтры списка и выгрузки устройств, переводятся в WHERE"""
+    is_active: Optional[bool] = None
+    firmware_version: Optional[str] = None
+    min_batteries: Optional[int] = None
+    max_batteries: Optional[int] = None
+
 class DeviceBase(BaseModel):
     #Нзвание устройства в пределах от 1 до 100 символов, содержит примеры и описание
     name: str = Field(
@@ -123,12 +136,45 @@ class Device(DeviceBase):
 #Для ответа списка устройств
 class DeviceList(BaseModel):
     devices: List[Device]
-    total: int
+    total: Optional[int]
+    skip: int = 0
+    limit: int = 100
+    #Курсор следующей страницы, None если страница последняя
+    next_cursor: Optional[str] = None
+
+
+class DeviceSummary(BaseModel):
+    """Устройство без списка батарей: их количество и емкость по всем батареям"""
+    id: int
+    name: str
+    firmware_version: str
+    is_active: bool
+    battery_count: int = Field(..., description="Number of attached batteries")
+    min_capacity: Optional[float] = Field(None, description="Lowest residual capacity among batteries, %")
+    avg_capacity: Optional[float] = Field(None, description="Average residual capacity of batteries, %")
+
+
+class DeviceSummaryList(BaseModel):
+    devices: List[DeviceSummary]
+    total: Optional[int]
     skip: int = 0
     limit: int = 100
+    next_cursor: Optional[str] = None
 
 
 class DeviceResponse(BaseModel):
     success: Optional[bool]=True
     data: Optional[Device]
-    message: Optional[str]=""
\ No newline at end of file
+    message: Optional[str]=""
+
+class DeviceBatchItem(BaseModel):
+    """Результат для одного запрошенного id: found=False и data=None, если устройства нет"""
+    id: int
+    found: bool
+    data: Optional[Device] = None
+
+
+class DeviceBatchResponse(BaseModel):
+    success: bool = True
+    items: List[DeviceBatchItem] = Field(default_factory=list, description="Results in the requested order")
+    missing: List[int] = Field(default_factory=list, description="Requested ids that were not found")
@@ -0,0 +1,72 @@
+from datetime import datetime, timezone
+from pydantic import BaseModel, Field, field_validator, ConfigDict
+from typing import List, Optional
+
+
+class ReadingCreate(BaseModel):
+    """Схема одного показания телеметрии"""
+    battery_id: int = Field(
+        ...,
+        examples=[1, 2, 3],
+        description="The identifier of the battery the reading belongs to"
+    )
+    recorded_at: datetime = Field(
+        ...,
+        examples=["2026-10-17T10:00:00Z"],
+        description="Time the reading was taken, naive values are treated as UTC"
+    )
+    voltage: float = Field(
+        ...,
+        ge=0,
+        le=1000,
+        examples=[12.4],
+        description="Measured voltage in volts"
+    )
+    capacity: float = Field(
+        ...,
+        ge=0,
+        le=100,
+        examples=[87.5],
+        description="Residual capacity in percentage"
+    )
+
+    @field_validator('recorded_at')
+    def validate_timezone(cls, v: datetime) -> datetime:
+        """Приводим время к UTC, чтобы секция выбиралась однозначно"""
+        if v.tzinfo is None:
+            return v.replace(tzinfo=timezone.utc)
+        return v.astimezone(timezone.utc)
+
+
+class ReadingBatch(BaseModel):
+    """Схема пачки показаний"""
+    readings: List[ReadingCreate] = Field(
+        ...,
+        min_length=1,
+        max_length=50000,
+        description="Readings to store"
+    )
+
+
+class ReadingReject(BaseModel):
+    """Отклоненное показание"""
+    index: int = Field(..., description="Position of the reading in the request")
+    battery_id: int
+    detail: str
+
+
+class ReadingBatchResponse(BaseModel):
+    success: bool = True
+    accepted: int = 0
+    rejected: List[ReadingReject] = Field(default_factory=list)
+    message: Optional[str] = ""
+
+
+class Reading(BaseModel):
+    """Схема показания для ответа API"""
+    battery_id: int
+    recorded_at: datetime
+    voltage: float
+    capacity: float
+
+    model_config = ConfigDict(from_attributes=True)
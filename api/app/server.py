@@ -0,0 +1,41 @@
+"""
+Production-запуск API: несколько процессов uvicorn с uvloop и httptools.
+
+    python -m app.server
+
+Число процессов - SERVER_WORKERS (0 - по числу ядер). Каждый воркер импортирует приложение
+заново и в lifespan создает свой движок и пул соединений, а при остановке закрывает их.
+Всего к базе может быть открыто до workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) соединений.
+Кэш ответов у каждого воркера свой, поэтому при нескольких воркерах включается
+RESPONSE_CACHE_VALIDATE: запись из кэша отдается, только если ее ETag совпадает с базой
+"""
+import os
+
+import uvicorn
+
+from app.config import settings
+
+
+def worker_count() -> int:
+    return settings.SERVER_WORKERS or os.cpu_count() or 1
+
+
+def main() -> None:
+    workers = worker_count()
+    if workers > 1:
+        #Воркеры запускаются новыми процессами и читают настройки из окружения
+        os.environ.setdefault("RESPONSE_CACHE_VALIDATE", "true")
+    uvicorn.run(
+        "app.main:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        lifespan="on",
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import asyncio
+import bisect
+import logging
+
+from app.config import settings
+from app.crud.battery import BatteryCRUD
+from app.database import async_session_maker
+from app.services.alerts import AlertBroadcaster, alert_broadcaster
+
+logger = logging.getLogger("app.alerts")
+
+ALERTS = ("low_capacity", "need_replacement")
+
+
+class AlertSets:
+    """
+    Текущие id батарей в алертах low_capacity и need_replacement в памяти процесса.
+    Меняются по событиям потока алертов (NOTIFY от триггера на batteries приходит
+    во все воркеры, включая записи других процессов) и периодически сверяются с базой.
+    Множествам можно верить, только пока живо LISTEN-соединение, для которого
+    сделана последняя сверка; иначе ready=False и алерты читаются из базы.
+    Id хранятся отсортированными списками, чтобы первые limit брались срезом
+    """
+    def __init__(self, broadcaster: AlertBroadcaster, interval: float):
+        self.broadcaster = broadcaster
+        self.interval = interval
+        self.members: dict[str, list[int]] = {alert: [] for alert in ALERTS}
+        #Поколение LISTEN-соединения, для которого сделана сверка
+        self._generation: int | None = None
+        #События, пришедшие во время сверки: применяются поверх ее результата
+        self._pending: list[dict] | None = None
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.reconciles = 0
+        self.changes = 0
+        self.drift = 0
+        broadcaster.add_handler(self._on_event)
+
+    @property
+    def ready(self) -> bool:
+        return self.broadcaster.connected and self._generation == self.broadcaster.generation
+
+    def _on_event(self, kind: str, data: dict) -> None:
+        if kind == "resync":
+            # Новое LISTEN-соединение: сверяемся сразу, не дожидаясь интервала
+            self._wake.set()
+            return
+        if kind != "alert":
+            return
+        if self._pending is not None:
+            self._pending.append(data)
+        self._apply(self.members, data)
+        self.changes += 1
+
+    @staticmethod
+    def _apply(members: dict[str, list[int]], data: dict) -> None:
+        ids = members.get(data.get("alert"))
+        if ids is None:
+            return
+        battery_id = data["battery_id"]
+        position = bisect.bisect_left(ids, battery_id)
+        present = position < len(ids) and ids[position] == battery_id
+        if data.get("active") and not present:
+            ids.insert(position, battery_id)
+        elif not data.get("active") and present:
+            del ids[position]
+
+    def ids(self, alert: str, limit: int) -> list[int]:
+        """Первые limit id алерта по возрастанию"""
+        return self.members[alert][:limit]
+
+    def count(self, alert: str) -> int:
+        return len(self.members[alert])
+
+    async def reconcile(self) -> None:
+        """Перечитать множества из базы"""
+        generation = self.broadcaster.generation
+        if not self.broadcaster.connected:
+            return
+        self._pending = []
+        try:
+            async with async_session_maker() as session:
+                members = {alert: sorted(ids) for alert, ids in (await BatteryCRUD(session).get_alert_member_ids()).items()}
+            for data in self._pending:
+                self._apply(members, data)
+        finally:
+            self._pending = None
+        if self._generation == generation:
+            # Расхождение при живом соединении означает потерянные уведомления
+            self.drift += sum(len(set(members[alert]) ^ set(self.members[alert])) for alert in ALERTS)
+        self.members = members
+        self._generation = generation
+        self.reconciles += 1
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._reconcile_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _reconcile_forever(self) -> None:
+        while True:
+            self._wake.clear()
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("alert reconcile failed: %s", e)
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "ready": self.ready,
+            "reconciles": self.reconciles,
+            "changes": self.changes,
+            "drift": self.drift,
+            **{alert: len(ids) for alert, ids in self.members.items()},
+        }
+
+
+alert_sets = AlertSets(alert_broadcaster, settings.ALERT_RECONCILE_INTERVAL)
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable
+
+import asyncpg
+
+from app.config import settings
+
+logger = logging.getLogger("app.alerts")
+
+#Канал, в который пишет триггер battery_alert_notify (миграция 4bd783dc205c)
+ALERT_CHANNEL = "battery_alerts"
+#Канал триггера batteries_changed (миграция 356533d18753): любое изменение batteries
+CHANGES_CHANNEL = "batteries_changed"
+
+
+class AlertBroadcaster:
+    """
+    Раздача событий алертов батарей подписчикам процесса.
+    На процесс (воркер) держится одно LISTEN-соединение вне пула SQLAlchemy,
+    поэтому число открытых дашбордов не меняет нагрузку на базу.
+    У каждого подписчика своя ограниченная очередь: медленный клиент теряет
+    самые старые события, а не задерживает остальных.
+    После каждого подключения подписчикам уходит событие resync - уведомления,
+    пропущенные без LISTEN-соединения, нужно перечитать через /alerts/*.
+    То же соединение слушает изменения batteries: обработчики получают событие changed,
+    подписчикам потока оно не уходит
+    """
+    def __init__(self, queue_size: int, heartbeat: float, reconnect_delay: float):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.reconnect_delay = reconnect_delay
+        self._subscribers: set[asyncio.Queue] = set()
+        self._handlers: list[Callable[[str, dict], None]] = []
+        self._connection: asyncpg.Connection | None = None
+        self._task: asyncio.Task | None = None
+        self.events = 0
+        self.dropped = 0
+        self.reconnects = 0
+        #Номер текущего LISTEN-соединения: события между соединениями могли потеряться
+        self.generation = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed()
+
+    async def start(self) -> None:
+        """Запустить слушателя в фоне (приложение стартует, даже если база недоступна)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        """Остановить слушателя и закрыть LISTEN-соединение"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen_forever(self) -> None:
+        first = True
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(
+                    host=settings.DB_HOST,
+                    port=settings.DB_PORT,
+                    user=settings.DB_USER,
+                    password=settings.DB_PASS,
+                    database=settings.DB_NAME,
+                )
+                await connection.add_listener(ALERT_CHANNEL, self._on_notify)
+                await connection.add_listener(CHANGES_CHANNEL, self._on_change)
+                self._connection = connection
+                self.generation += 1
+                if not first:
+                    self.reconnects += 1
+                first = False
+                self.publish("resync", {})
+                # Тихое соединение не узнает о разрыве сети, поэтому его периодически проверяем
+                while True:
+                    await asyncio.sleep(self.heartbeat)
+                    await connection.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("alert listener disconnected: %s", e)
+            finally:
+                self._connection = None
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("invalid alert payload: %s", payload)
+            return
+        self.publish("alert", event)
+
+    def _on_change(self, connection, pid: int, channel: str, payload: str) -> None:
+        for handler in self._handlers:
+            handler("changed", {})
+
+    def add_handler(self, handler: Callable[[str, dict], None]) -> None:
+        """Синхронный обработчик, который получает каждое событие раньше подписчиков"""
+        self._handlers.append(handler)
+
+    def publish(self, kind: str, data: dict) -> None:
+        """Передать событие обработчикам и положить в очереди всех подписчиков"""
+        self.events += 1
+        for handler in self._handlers:
+            handler(kind, data)
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait((kind, data))
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue]:
+        """Очередь событий (kind, data) на время жизни подписки"""
+        queue = asyncio.Queue(self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    async def sse(self) -> AsyncIterator[str]:
+        """События в формате text/event-stream, с комментарием-heartbeat в тишине"""
+        async with self.subscribe() as queue:
+            yield f"retry: {int(self.reconnect_delay * 1000)}\n\n"
+            while True:
+                try:
+                    kind, data = await asyncio.wait_for(queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    # Не дает прокси закрыть простаивающее соединение
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: {kind}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+    def stats(self) -> dict:
+        return {
+            "connected": self.connected,
+            "subscribers": len(self._subscribers),
+            "events": self.events,
+            "dropped": self.dropped,
+            "reconnects": self.reconnects,
+            "generation": self.generation,
+        }
+
+
+alert_broadcaster = AlertBroadcaster(settings.ALERT_QUEUE_SIZE, settings.ALERT_HEARTBEAT, settings.ALERT_RECONNECT_DELAY)
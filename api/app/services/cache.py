@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from app.config import settings
+
+
+class ResponseCache:
+    """
+    LRU-кэш сериализованных ответов с TTL в памяти процесса.
+    Значение - пара (ETag, JSON-байты).
+    Запись, прочитанная из базы до инвалидации ключа, в кэш не попадет:
+    перед чтением берется метка reserve(), а set() сверяет ее с моментом
+    последней инвалидации
+    """
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        # Номер последней инвалидации по ключу, хранится для maxsize последних ключей
+        self._invalidated: OrderedDict[Hashable, int] = OrderedDict()
+        self._epoch = 0
+        self._forgotten_epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 and self.ttl > 0
+
+    def get(self, key: Hashable) -> Any | None:
+        """Вернуть закэшированный ответ или None"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def reserve(self, key: Hashable) -> int:
+        """Метка, которую нужно взять перед чтением данных из базы"""
+        return self._epoch
+
+    def set(self, key: Hashable, value: Any, token: int) -> None:
+        """Сохранить ответ, если ключ не инвалидировали после reserve()"""
+        if not self.enabled:
+            return
+        if self._invalidated.get(key, self._forgotten_epoch) > token:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys: Hashable) -> None:
+        """Удалить ответы по ключам после изменения данных"""
+        self._epoch += 1
+        for key in keys:
+            if key is None:
+                continue
+            self._data.pop(key, None)
+            self._invalidated[key] = self._epoch
+            self._invalidated.move_to_end(key)
+            self.invalidations += 1
+        while len(self._invalidated) > max(self.maxsize, 1):
+            _, epoch = self._invalidated.popitem(last=False)
+            self._forgotten_epoch = max(self._forgotten_epoch, epoch)
+
+    def stats(self) -> dict:
+        """Счетчики попаданий, промахов и вытеснений"""
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+#Кэши ответов GET /api/devices/{id} и GET /api/batteries/{id}, ключ - id
+device_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL)
+battery_cache = ResponseCache(settings.RESPONSE_CACHE_SIZE, settings.RESPONSE_CACHE_TTL)
@@ -0,0 +1,36 @@
+import hashlib
+from typing import Iterable
+
+from fastapi import Response, status
+
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из версий строк и параметров представления"""
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def versions_digest(versions: Iterable[int]) -> tuple[int, int, int]:
+    """
+    Свертка набора версий строк: количество, максимум и сумма.
+    Версии берутся из одной последовательности и только растут, поэтому
+    добавление, изменение или удаление строки меняет хотя бы одно из чисел.
+    SQL-вариант в CRUD считает то же самое через count/max/sum
+    """
+    versions = list(versions)
+    return len(versions), max(versions, default=0), sum(versions)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, как требует RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def not_modified(etag: str) -> Response:
+    """Ответ 304 без тела"""
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
@@ -0,0 +1,36 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Sequence
+
+#Форматы выгрузки: NDJSON (объект на строку) и CSV с заголовком
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+async def render_export(chunks: AsyncIterator[Sequence[dict]], fields: Sequence[str], fmt: str) -> AsyncIterator[bytes]:
+    """
+    Превращает пачки строк из серверного курсора в куски ответа.
+    В памяти одновременно находится только одна пачка
+    """
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        yield buffer.getvalue().encode()
+        async for chunk in chunks:
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows(chunk)
+            yield buffer.getvalue().encode()
+        return
+
+    async for chunk in chunks:
+        yield "".join(json.dumps(dict(row), separators=(",", ":")) + "\n" for row in chunk).encode()
+
+
+def export_headers(name: str, fmt: str) -> dict:
+    """Заголовки, чтобы браузер сохранил выгрузку в файл"""
+    return {"Content-Disposition": f'attachment; filename="{name}.{fmt}"'}
@@ -0,0 +1,97 @@
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any, Callable, Union, get_args, get_origin
+
+from fastapi.responses import Response
+from pydantic import BaseModel
+from pydantic_core import to_json
+
+
+_MISSING = object()
+
+
+class FastJSONResponse(Response):
+    """JSON-ответ из готовых словарей и списков через pydantic-core, без схемы ответа"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return to_json(content)
+
+
+def _nested(annotation) -> tuple[type[BaseModel] | None, bool]:
+    """Вложенная схема поля и признак списка: List[Battery] -> (Battery, True)"""
+    origin = get_origin(annotation)
+    if origin is Union:
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        return _nested(args[0]) if len(args) == 1 else (None, False)
+    if origin in (list, tuple, set):
+        model, _ = _nested(get_args(annotation)[0])
+        return model, model is not None
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None, False
+
+
+@lru_cache
+def dumper(model: type[BaseModel]) -> Callable[[Any], dict]:
+    """
+    Функция, которая собирает словарь по полям схемы из ORM-объекта,
+    строки-маппинга или словаря. Валидаторы и проверки типов схемы не запускаются:
+    данные из базы уже прошли их при записи, поэтому применять ее можно только к ним
+    """
+    plan = []
+    for name, field in model.model_fields.items():
+        nested, many = _nested(field.annotation)
+        default = None if field.is_required() else field.get_default(call_default_factory=True)
+        plan.append((name, dumper(nested) if nested else None, many, default))
+
+    def dump(obj: Any) -> dict:
+        mapping = isinstance(obj, Mapping)
+        # Загруженные колонки ORM-объекта лежат в __dict__: читаем их мимо дескрипторов
+        source = obj if mapping else getattr(obj, "__dict__", {})
+        data = {}
+        for name, nested, many, default in plan:
+            value = source.get(name, _MISSING)
+            if value is _MISSING:
+                value = default if mapping else getattr(obj, name, default)
+            if nested is not None and value is not None:
+                value = [nested(item) for item in value] if many else nested(value)
+            data[name] = value
+        return data
+
+    return dump
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return dict(value)
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def pick(row: Mapping, fields: tuple[str, ...]) -> dict:
+    """Только выбранные поля строки (?fields=), вложенные строки-маппинги - словарями"""
+    return {name: _plain(row[name]) for name in fields}
+
+
+def dump_json(model: type[BaseModel], data: Any) -> bytes:
+    """JSON-байты в форме схемы model без повторной валидации"""
+    return to_json(dumper(model)(data))
+
+
+def fast_json(model: type[BaseModel], data: Any, response: Response | None = None) -> FastJSONResponse:
+    """
+    Ответ в форме схемы model без повторной валидации.
+    Заголовки, выставленные обработчиком в response (например ETag), переносятся
+    """
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    return FastJSONResponse(dumper(model)(data), headers=headers)
+
+
+def fast_json_list(model: type[BaseModel], items: list) -> FastJSONResponse:
+    """Ответ-список схем model без повторной валидации"""
+    dump = dumper(model)
+    return FastJSONResponse([dump(item) for item in items])
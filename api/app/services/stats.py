@@ -0,0 +1,64 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+from app.config import settings
+from app.services.alerts import AlertBroadcaster, alert_broadcaster
+
+
+class StatsCache:
+    """
+    Кэш сводной статистики по батареям в памяти процесса.
+    Значение живет ttl секунд и сбрасывается при любом изменении батарей: в этом процессе -
+    сразу из CRUD, в остальных - по уведомлению batteries_changed через LISTEN-соединение.
+    Если процессов несколько (RESPONSE_CACHE_VALIDATE), а LISTEN-соединения нет,
+    статистика считается на каждый запрос
+    """
+    def __init__(self, ttl: float, broadcaster: AlertBroadcaster):
+        self.ttl = ttl
+        self.broadcaster = broadcaster
+        self._value: dict | None = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        broadcaster.add_handler(self._on_event)
+
+    def _on_event(self, kind: str, data: dict) -> None:
+        #resync - уведомления могли потеряться, пока соединения не было
+        if kind in ("changed", "resync"):
+            self.invalidate()
+
+    def _fresh(self) -> bool:
+        return self._value is not None and time.monotonic() < self._expires_at
+
+    async def get(self, loader: Callable[[], Awaitable[dict]], store: bool = True) -> dict:
+        """
+        Вернуть статистику из кэша или посчитать ее через loader.
+        store=False - посчитанное не сохранять (loader читает из реплики, которая может отставать)
+        """
+        if self.ttl <= 0 or (settings.RESPONSE_CACHE_VALIDATE and not self.broadcaster.connected):
+            return await loader()
+        if self._fresh():
+            return self._value
+        if not store:
+            return await loader()
+
+        # Одновременные промахи ждут один запрос к базе, а не делают каждый свой
+        async with self._lock:
+            if self._fresh():
+                return self._value
+            generation = self._generation
+            value = await loader()
+            # Если за время запроса данные изменились, результат уже устарел
+            if generation == self._generation:
+                self._value = value
+                self._expires_at = time.monotonic() + self.ttl
+            return value
+
+    def invalidate(self) -> None:
+        """Сбросить кэш после изменения батарей"""
+        self._generation += 1
+        self._value = None
+
+
+stats_cache = StatsCache(settings.STATS_CACHE_TTL, alert_broadcaster)
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import time
+from contextlib import AsyncExitStack
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.crud.battery import BatteryCRUD
+from app.crud.device import DeviceCRUD
+from app.database import get_engine
+
+logger = logging.getLogger("app.database")
+
+
+async def prepare_hot_statements(session: AsyncSession) -> int:
+    """
+    Выполнить частые запросы чтения на соединении сессии с несуществующими id и limit=1.
+    Текст SQL тот же, что у запросов API (значения - параметры), поэтому asyncpg оставляет
+    их подготовленными на этом соединении, а SQLAlchemy - скомпилированными в своем кэше.
+    Точный count(*) не выполняется: он читает всю таблицу на каждом соединении каждого воркера,
+    вместо него - оценка планировщика. Возвращает число выполненных запросов
+    """
+    devices = DeviceCRUD(session)
+    batteries = BatteryCRUD(session)
+    calls = (
+        lambda: devices.get(0),
+        lambda: devices.get_etag(0),
+        lambda: devices.count("estimated"),
+        lambda: devices.page_etag(1),
+        lambda: devices.get_page(1),
+        lambda: devices.get_many([0]),
+        lambda: batteries.get(0),
+        lambda: batteries.get_etag(0),
+        lambda: batteries.count("estimated"),
+        lambda: batteries.page_etag(1),
+        lambda: batteries.get_page(1),
+        lambda: batteries.get_many([0]),
+        lambda: batteries.get_by_device(0),
+    )
+    for call in calls:
+        await call()
+    return len(calls)
+
+
+class Warmup:
+    """
+    Прогрев процесса после старта: открыть до connections соединений пула и подготовить
+    на каждом частые запросы. Идет в фоне, чтобы процесс сразу отвечал на /health/live;
+    пока прогрев не закончен, /health/ready отвечает 503
+    """
+    def __init__(self):
+        self.done = False
+        self.connections = 0
+        self.statements = 0
+        self.duration: float | None = None
+        self.error: str | None = None
+        self._task: asyncio.Task | None = None
+
+    async def run(self, connections: int, prepare: bool) -> None:
+        started = time.perf_counter()
+        try:
+            #Соединения держатся до конца прогрева, иначе пул выдавал бы одно и то же
+            async with AsyncExitStack() as stack:
+                for _ in range(min(connections, settings.DB_POOL_SIZE)):
+                    connection = await stack.enter_async_context(get_engine().connect())
+                    if prepare:
+                        async with AsyncSession(bind=connection) as session:
+                            self.statements += await prepare_hot_statements(session)
+                    else:
+                        await connection.execute(text("SELECT 1"))
+                    self.connections += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = str(e)
+            logger.warning("pool warm-up failed: %s", e)
+        finally:
+            self.duration = time.perf_counter() - started
+            self.done = True
+
+    def start(self, connections: int, prepare: bool) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run(connections, prepare))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "done": self.done,
+            "connections": self.connections,
+            "statements": self.statements,
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            "error": self.error,
+        }
+
+
+warmup = Warmup()
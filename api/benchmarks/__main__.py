@@ -0,0 +1,112 @@
+"""
+Нагрузочный бенчмарк HTTP-маршрутов устройств и батарей.
+
+    python -m benchmarks --batteries 100000 --concurrency 16 --output results.json
+    python -m benchmarks --baseline results.json --max-regression 20
+
+Без --url приложение запускается в этом же процессе (httpx.ASGITransport),
+с --url запросы идут в уже запущенный сервер. Данные пишутся в базу из .env
+"""
+import argparse
+import asyncio
+import json
+import platform
+import subprocess
+import sys
+import uuid
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+
+from app.database import async_session_maker, dispose_engine, init_engine
+from benchmarks.fleet import Fleet, cleanup_scratch, seed_fleet
+from benchmarks.runner import compare, open_client, run_scenario
+from benchmarks.scenarios import SCENARIOS
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="HTTP-бенчмарк маршрутов API")
+    parser.add_argument("--batteries", type=int, default=1000, help="Размер парка (батарей, по 5 на устройство)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Одновременных запросов")
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на сценарий")
+    parser.add_argument("--warmup", type=int, default=10, help="Прогревочных запросов для сценариев чтения")
+    parser.add_argument("--url", default=None, help="Адрес запущенного сервера (по умолчанию приложение в процессе)")
+    parser.add_argument("--only", action="append", default=[], help="Запускать только сценарии, содержащие подстроку")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Куда сохранить результаты (JSON)")
+    parser.add_argument("--baseline", default=None, help="Результаты прошлого прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=20.0, help="Допустимое ухудшение, проценты")
+    parser.add_argument("--keep", action="store_true", help="Не удалять временные объекты после прогона")
+    return parser.parse_args(argv)
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+def print_table(results: dict) -> None:
+    print(f"{'scenario':58} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'sql':>6} {'err':>5}")
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        queries = result["queries_per_request"]["mean"]
+        print(
+            f"{name:58} {result['throughput_rps']:>9} {latency['p50']:>9} {latency['p95']:>9} "
+            f"{latency['p99']:>9} {'-' if queries is None else queries:>6} {result['errors']:>5}"
+        )
+
+
+async def main(args: argparse.Namespace) -> int:
+    scenarios = [s for s in SCENARIOS if not args.only or any(part in s.name for part in args.only)]
+    init_engine()
+    device_ids, battery_ids = await seed_fleet(async_session_maker, args.batteries, args.seed)
+    fleet = Fleet(async_session_maker, device_ids, battery_ids, run_id=uuid.uuid4().hex[:8])
+
+    results = {}
+    async with AsyncExitStack() as stack:
+        client = await open_client(stack, args.url)
+        try:
+            for scenario in scenarios:
+                results[scenario.name] = await run_scenario(client, fleet, scenario, args.requests, args.concurrency, args.warmup)
+        finally:
+            if not args.keep:
+                await cleanup_scratch(async_session_maker)
+    await dispose_engine()
+
+    print_table(results)
+    report = {
+        "meta": {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "target": args.url or "asgi",
+            "batteries": len(battery_ids),
+            "devices": len(device_ids),
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    failed = False
+    for name, result in results.items():
+        over_budget = result["queries_per_request"]["over_budget"]
+        if over_budget:
+            print(f"OVER BUDGET {name}: {over_budget} requests made more than {result['queries_per_request']['budget']} SQL queries", file=sys.stderr)
+        failed = failed or bool(result["errors"] or over_budget)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.max_regression)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
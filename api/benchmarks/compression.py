@@ -0,0 +1,100 @@
+"""
+Сжатие ответов: сколько CPU стоит каждый кодек и профиль и сколько байт он экономит.
+Без базы и HTTP: тела собираются из тех же строк, что и в benchmarks.serialization.
+
+    python -m benchmarks.compression --items 1000 --repeat 20
+
+Тела: страница устройств с батареями (JSON целиком) и выгрузка батарей в NDJSON
+пачками по --chunk строк (сжатие по кускам со сбросом буфера, как у потоковых ответов).
+Кодеки br и zstd измеряются, только если установлены brotli и zstandard
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from app.middleware.compression import CODECS, LEVELS, compress
+from app.schemas.device import DeviceList
+from app.services.export import render_export
+from app.services.fast_json import dump_json
+from benchmarks.serialization import make_batteries, make_devices
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compression", description="Бенчмарк сжатия ответов")
+    parser.add_argument("--items", type=int, default=1000, help="Устройств на странице и x5 батарей в выгрузке")
+    parser.add_argument("--chunk", type=int, default=1000, help="Строк в куске выгрузки")
+    parser.add_argument("--repeat", type=int, default=20, help="Повторов каждого замера")
+    parser.add_argument("--output", default=None, help="Куда сохранить результаты (JSON)")
+    return parser.parse_args(argv)
+
+
+def export_chunks(rows: list[dict], size: int) -> list[bytes]:
+    """Куски NDJSON в том виде, в каком их отдает render_export"""
+    async def source():
+        for start in range(0, len(rows), size):
+            yield rows[start:start + size]
+
+    async def collect():
+        return [chunk async for chunk in render_export(source(), list(rows[0]), "ndjson")]
+
+    return asyncio.run(collect())
+
+
+def compress_stream(encoding: str, chunks: list[bytes], profile: str) -> bytes:
+    compressor = CODECS[encoding](LEVELS[encoding][profile])
+    out = [compressor.compress(chunk) + compressor.flush() for chunk in chunks]
+    out.append(compressor.finish())
+    return b"".join(out)
+
+
+def measure(fn, repeat: int) -> float:
+    fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def main(args: argparse.Namespace) -> int:
+    rows = make_devices(args.items)
+    page = dump_json(DeviceList, dict(devices=rows, total=len(rows), skip=0, limit=len(rows), next_cursor=None))
+    chunks = export_chunks(make_batteries(args.items * 5), args.chunk)
+    bodies = {
+        "devices_page": (len(page), lambda encoding, profile: compress(encoding, page, profile)),
+        "batteries_export": (sum(map(len, chunks)), lambda encoding, profile: compress_stream(encoding, chunks, profile)),
+    }
+
+    report = {"items": args.items, "chunk": args.chunk, "repeat": args.repeat, "codecs": list(CODECS), "results": {}}
+    for body, (size, fn) in bodies.items():
+        results = {}
+        for encoding in CODECS:
+            for profile in LEVELS[encoding]:
+                compressed = len(fn(encoding, profile))
+                seconds = measure(lambda: fn(encoding, profile), args.repeat)
+                results[f"{encoding}/{profile}"] = {
+                    "level": LEVELS[encoding][profile],
+                    "bytes": compressed,
+                    "ratio": round(size / compressed, 2),
+                    "cpu_ms": round(seconds * 1000, 3),
+                    "mb_per_s": round(size / seconds / 1e6, 1),
+                }
+        report["results"][body] = {"bytes": size, "codecs": results}
+
+    print(f"{'body':18} {'codec':16} {'level':>5} {'bytes':>10} {'ratio':>7} {'cpu ms':>9} {'MB/s':>8}")
+    for body, result in report["results"].items():
+        print(f"{body:18} {'identity':16} {'-':>5} {result['bytes']:>10} {1.0:>7} {0:>9} {'-':>8}")
+        for codec, row in result["codecs"].items():
+            print(f"{body:18} {codec:16} {row['level']:>5} {row['bytes']:>10} {row['ratio']:>7} {row['cpu_ms']:>9} {row['mb_per_s']:>8}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,128 @@
+import math
+import random
+from dataclasses import dataclass, field
+from itertools import count
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models.battery import Battery
+from app.models.device import Device
+
+#Префиксы имен, по которым бенчмарк находит и удаляет свои данные
+FLEET_PREFIX = "bench"
+SCRATCH_PREFIX = "benchtmp"
+
+VOLTAGES = (1.2, 1.5, 3.7, 12.0, 24.0, 48.0)
+COPY_CHUNK = 50000
+
+
+@dataclass
+class Fleet:
+    """Засеянный парк и временные объекты для сценариев записи"""
+    session_maker: async_sessionmaker
+    device_ids: list[int]
+    battery_ids: list[int]
+    run_id: str
+    pools: dict[str, list] = field(default_factory=dict)
+    _names: count = field(default_factory=count)
+
+    def unique_name(self, kind: str) -> str:
+        """Уникальное имя для объектов, создаваемых во время прогона"""
+        return f"{SCRATCH_PREFIX}-{self.run_id}-{kind}-{next(self._names)}"
+
+    async def scratch_devices(self, n: int, batteries_each: int = 0) -> list[tuple[int, list[int]]]:
+        """Создать n временных устройств, у каждого batteries_each батарей"""
+        async with self.session_maker() as session:
+            result = await session.execute(
+                insert(Device).returning(Device.id, sort_by_parameter_order=True),
+                [{"name": self.unique_name("d"), "firmware_version": "1.0.0", "is_active": True} for _ in range(n)]
+            )
+            device_ids = list(result.scalars().all())
+            created = [(device_id, []) for device_id in device_ids]
+            if batteries_each:
+                rows = [
+                    {
+                        "name": self.unique_name("b"),
+                        "nominal_voltage": 12.0,
+                        "residual_capacity": 50.0,
+                        "service_life": 365,
+                        "device_id": device_id,
+                    }
+                    for device_id in device_ids
+                    for _ in range(batteries_each)
+                ]
+                result = await session.execute(
+                    insert(Battery).returning(Battery.id, Battery.device_id, sort_by_parameter_order=True),
+                    rows
+                )
+                by_device = dict(created)
+                for battery_id, device_id in result.all():
+                    by_device[device_id].append(battery_id)
+            await session.commit()
+        return created
+
+
+async def _copy(session: AsyncSession, table: str, columns: tuple, records: list) -> None:
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(table, records=records, columns=columns)
+
+
+async def seed_fleet(session_maker: async_sessionmaker, batteries: int, seed: int = 42) -> tuple[list[int], list[int]]:
+    """
+    Досеять парк до batteries батарей (по 5 на устройство) через COPY.
+    Повторный запуск с тем же размером ничего не вставляет.
+    Возвращает id устройств и батарей парка
+    """
+    rng = random.Random(seed)
+    devices_needed = math.ceil(batteries / 5)
+    async with session_maker() as session:
+        existing = await session.scalar(select(func.count(Device.id)).where(Device.name.like(f"{FLEET_PREFIX}-d-%")))
+        for start in range(existing, devices_needed, COPY_CHUNK):
+            stop = min(start + COPY_CHUNK, devices_needed)
+            records = [(f"{FLEET_PREFIX}-d-{i:08d}", f"{1 + i % 3}.{i % 10}.0", i % 10 != 0) for i in range(start, stop)]
+            await _copy(session, "devices", ("name", "firmware_version", "is_active"), records)
+        await session.commit()
+
+        result = await session.execute(
+            select(Device.id).where(Device.name.like(f"{FLEET_PREFIX}-d-%")).order_by(Device.name).limit(devices_needed)
+        )
+        device_ids = list(result.scalars().all())
+
+        existing = await session.scalar(select(func.count(Battery.id)).where(Battery.name.like(f"{FLEET_PREFIX}-b-%")))
+        for start in range(existing, batteries, COPY_CHUNK):
+            stop = min(start + COPY_CHUNK, batteries)
+            records = [
+                (
+                    f"{FLEET_PREFIX}-b-{i:08d}",
+                    rng.choice(VOLTAGES),
+                    round(rng.uniform(0, 100), 1),
+                    rng.randint(1, 3650),
+                    device_ids[i // 5],
+                )
+                for i in range(start, stop)
+            ]
+            await _copy(session, "batteries", ("name", "nominal_voltage", "residual_capacity", "service_life", "device_id"), records)
+        await session.commit()
+
+        result = await session.execute(
+            select(Battery.id).where(Battery.name.like(f"{FLEET_PREFIX}-b-%")).order_by(Battery.name).limit(batteries)
+        )
+        battery_ids = list(result.scalars().all())
+
+    # Свежая статистика планировщика, иначе первые прогоны идут по плохим планам
+    async with session_maker() as session:
+        connection = await session.connection()
+        await connection.exec_driver_sql("ANALYZE devices")
+        await connection.exec_driver_sql("ANALYZE batteries")
+        await session.commit()
+    return device_ids, battery_ids
+
+
+async def cleanup_scratch(session_maker: async_sessionmaker) -> None:
+    """Удалить все временные объекты бенчмарка (батареи удаляются каскадно)"""
+    async with session_maker() as session:
+        await session.execute(delete(Battery).where(Battery.name.like(f"{SCRATCH_PREFIX}-%")))
+        await session.execute(delete(Device).where(Device.name.like(f"{SCRATCH_PREFIX}-%")))
+        await session.commit()
@@ -0,0 +1,117 @@
+import asyncio
+import math
+import time
+from collections import Counter
+
+from contextlib import AsyncExitStack
+
+import httpx
+
+from benchmarks.fleet import Fleet
+from benchmarks.scenarios import Scenario
+
+
+async def open_client(stack: AsyncExitStack, url: str | None) -> httpx.AsyncClient:
+    """
+    HTTP-клиент для прогона: к запущенному серверу по url
+    или к приложению в этом же процессе (с его lifespan)
+    """
+    if url:
+        return await stack.enter_async_context(httpx.AsyncClient(base_url=url, timeout=60))
+
+    from app.main import app
+    await stack.enter_async_context(app.router.lifespan_context(app))
+    transport = httpx.ASGITransport(app=app)
+    return await stack.enter_async_context(httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60))
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Перцентиль по методу ближайшего ранга"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+async def run_scenario(client: httpx.AsyncClient, fleet: Fleet, scenario: Scenario, requests: int, concurrency: int, warmup: int = 0) -> dict:
+    """Прогнать сценарий с фиксированным числом одновременных запросов"""
+    n = min(requests, scenario.max_requests or requests)
+    if scenario.setup:
+        await scenario.setup(fleet, n)
+
+    # Прогрев только для чтения: запросы записи расходуют подготовленные объекты
+    if scenario.read_only:
+        for i in range(min(warmup, n)):
+            method, url, body = scenario.build(fleet, i)
+            await client.request(method, url, json=body)
+
+    latencies: list[float] = []
+    queries: list[int] = []
+    statuses: Counter[int] = Counter()
+    errors = over_budget = 0
+    indexes = iter(range(n))
+
+    async def worker() -> None:
+        nonlocal errors, over_budget
+        for i in indexes:
+            method, url, body = scenario.build(fleet, i)
+            started = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+            if response.status_code not in scenario.expected:
+                errors += 1
+            query_count = response.headers.get("x-db-query-count")
+            if query_count is not None:
+                queries.append(int(query_count))
+                if scenario.query_budget is not None and int(query_count) > scenario.query_budget:
+                    over_budget += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, n))))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": n,
+        "errors": errors,
+        "statuses": {str(code): total for code, total in sorted(statuses.items())},
+        "throughput_rps": round(n / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            "mean": round(sum(latencies) / n * 1000, 3) if n else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "queries_per_request": {
+            "mean": round(sum(queries) / len(queries), 2) if queries else None,
+            "max": max(queries) if queries else None,
+            "budget": scenario.query_budget,
+            "over_budget": over_budget,
+        },
+    }
+
+
+def compare(results: dict, baseline: dict, max_regression: float) -> list[str]:
+    """
+    Сравнить прогон с сохраненным.
+    Регрессия: p95 вырос или пропускная способность упала больше чем на max_regression
+    процентов, либо маршрут стал делать больше SQL-запросов
+    """
+    regressions = []
+    factor = max_regression / 100
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        p95, old_p95 = current["latency_ms"]["p95"], previous["latency_ms"]["p95"]
+        if old_p95 and p95 > old_p95 * (1 + factor):
+            regressions.append(f"{name}: p95 {old_p95} -> {p95} ms")
+        rps, old_rps = current["throughput_rps"], previous["throughput_rps"]
+        if old_rps and rps < old_rps * (1 - factor):
+            regressions.append(f"{name}: throughput {old_rps} -> {rps} rps")
+        queries, old_queries = current["queries_per_request"]["mean"], previous["queries_per_request"]["mean"]
+        if queries is not None and old_queries is not None and queries > old_queries:
+            regressions.append(f"{name}: queries per request {old_queries} -> {queries}")
+    return regressions
@@ -0,0 +1,146 @@
+"""
+Масштабирование по процессам: пропускная способность python -m app.server
+при разном SERVER_WORKERS на одних и тех же сценариях чтения.
+
+    python -m benchmarks.scaling --workers 1,2,4 --clients 4 --concurrency 64
+
+Для каждого числа воркеров поднимается отдельный сервер на --port, нагрузку дают
+--clients процессов (один процесс клиента сам упирается в CPU раньше нескольких воркеров).
+Эффективность - прирост пропускной способности, деленный на прирост числа воркеров:
+100% - линейное масштабирование. Данные пишутся в базу из .env
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import httpx
+
+from app.database import async_session_maker, dispose_engine, init_engine
+from benchmarks.fleet import Fleet, seed_fleet
+from benchmarks.runner import run_scenario
+from benchmarks.scenarios import SCENARIOS
+
+DEFAULT_SCENARIOS = ("GET /api/devices/{device_id}", "GET /api/batteries/")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.scaling", description="Масштабирование API по процессам")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Числа воркеров через запятую")
+    parser.add_argument("--batteries", type=int, default=10000, help="Размер парка (батарей, по 5 на устройство)")
+    parser.add_argument("--clients", type=int, default=4, help="Процессов, дающих нагрузку")
+    parser.add_argument("--concurrency", type=int, default=64, help="Одновременных запросов на процесс клиента")
+    parser.add_argument("--requests", type=int, default=2000, help="Запросов на сценарий на процесс клиента")
+    parser.add_argument("--warmup", type=int, default=50, help="Прогревочных запросов на процесс клиента")
+    parser.add_argument("--only", action="append", default=[], help="Сценарии чтения, содержащие подстроку")
+    parser.add_argument("--port", type=int, default=8100, help="Порт запускаемого сервера")
+    parser.add_argument("--min-efficiency", type=float, default=None, help="Минимальная эффективность, проценты")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Куда сохранить результаты (JSON)")
+    return parser.parse_args(argv)
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {**os.environ, "SERVER_WORKERS": str(workers), "SERVER_PORT": str(port), "SERVER_HOST": "127.0.0.1"}
+    process = subprocess.Popen([sys.executable, "-m", "app.server"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("server did not start in 60 s")
+
+
+def stop_server(process: subprocess.Popen) -> None:
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def client_run(url: str, name: str, device_ids: list[int], battery_ids: list[int], args: argparse.Namespace) -> dict:
+    """Один процесс нагрузки: сценарий чтения по своему клиенту"""
+    scenario = next(s for s in SCENARIOS if s.name == name)
+    fleet = Fleet(None, device_ids, battery_ids, run_id=uuid.uuid4().hex[:8])
+
+    async def run() -> dict:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+            return await run_scenario(client, fleet, scenario, args.requests, args.concurrency, args.warmup)
+
+    return asyncio.run(run())
+
+
+def main(args: argparse.Namespace) -> int:
+    counts = [int(part) for part in args.workers.split(",") if part.strip()]
+    scenarios = [
+        s.name for s in SCENARIOS
+        if s.read_only and (any(part in s.name for part in args.only) if args.only else s.name in DEFAULT_SCENARIOS)
+    ]
+
+    async def seed():
+        init_engine()
+        try:
+            return await seed_fleet(async_session_maker, args.batteries, args.seed)
+        finally:
+            await dispose_engine()
+
+    device_ids, battery_ids = asyncio.run(seed())
+    url = f"http://127.0.0.1:{args.port}"
+
+    results: dict[str, dict[int, dict]] = {name: {} for name in scenarios}
+    with ProcessPoolExecutor(max_workers=args.clients) as pool:
+        for workers in counts:
+            server = start_server(workers, args.port)
+            try:
+                for name in scenarios:
+                    futures = [pool.submit(client_run, url, name, device_ids, battery_ids, args) for _ in range(args.clients)]
+                    parts = [future.result() for future in futures]
+                    results[name][workers] = {
+                        "throughput_rps": round(sum(part["throughput_rps"] for part in parts), 2),
+                        "p95_ms": max(part["latency_ms"]["p95"] for part in parts),
+                        "errors": sum(part["errors"] for part in parts),
+                    }
+            finally:
+                stop_server(server)
+
+    base_workers = counts[0]
+    failed = False
+    print(f"{'scenario':40} {'workers':>7} {'rps':>10} {'p95 ms':>9} {'speedup':>8} {'eff %':>6} {'err':>5}")
+    for name, by_workers in results.items():
+        base = by_workers[base_workers]["throughput_rps"]
+        for workers, result in by_workers.items():
+            speedup = result["throughput_rps"] / base if base else 0.0
+            result["speedup"] = round(speedup, 2)
+            result["efficiency_pct"] = round(speedup / (workers / base_workers) * 100, 1)
+            print(
+                f"{name:40} {workers:>7} {result['throughput_rps']:>10} {result['p95_ms']:>9} "
+                f"{result['speedup']:>8} {result['efficiency_pct']:>6} {result['errors']:>5}"
+            )
+            failed = failed or bool(result["errors"])
+            if args.min_efficiency is not None and result["efficiency_pct"] < args.min_efficiency:
+                print(f"SCALING {name}: {result['efficiency_pct']}% efficiency at {workers} workers", file=sys.stderr)
+                failed = True
+
+    if args.output:
+        report = {"cpu_count": os.cpu_count(), "clients": args.clients, "concurrency": args.concurrency, "results": results}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
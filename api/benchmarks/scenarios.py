@@ -0,0 +1,205 @@
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from benchmarks.fleet import Fleet
+
+#Запрос сценария: метод, путь и тело
+Request = tuple[str, str, dict | None]
+
+
+@dataclass
+class Scenario:
+    """
+    Сценарий нагрузки на один маршрут.
+    build(fleet, i) строит i-й запрос, setup(fleet, n) заранее создает
+    временные объекты для n запросов (нужно маршрутам записи и удаления).
+    query_budget - сколько SQL-запросов разрешено маршруту, превышение считается ошибкой
+    """
+    name: str
+    build: Callable[[Fleet, int], Request]
+    setup: Callable[[Fleet, int], Awaitable[None]] | None = None
+    expected: tuple[int, ...] = (200,)
+    max_requests: int | None = None
+    query_budget: int | None = None
+
+    @property
+    def read_only(self) -> bool:
+        return self.name.startswith("GET ")
+
+
+def pick(ids: list, i: int):
+    """Детерминированный, но разбросанный по парку выбор id"""
+    return ids[(i * 7919) % len(ids)]
+
+
+def battery_body(fleet: Fleet, device_id: int, i: int) -> dict:
+    return {
+        "name": fleet.unique_name("b"),
+        "nominal_voltage": 12.0,
+        "residual_capacity": float(i % 100),
+        "service_life": 100 + i % 3000,
+        "device_id": device_id,
+    }
+
+
+def pool_setup(key: str, batteries_each: int = 0, per_request: int = 1, cap: int | None = None):
+    """setup, создающий по per_request временных устройств на запрос (но не больше cap)"""
+    async def setup(fleet: Fleet, n: int) -> None:
+        size = n * per_request if cap is None else min(n * per_request, cap)
+        fleet.pools[key] = await fleet.scratch_devices(size, batteries_each)
+    return setup
+
+
+async def reassign_setup(fleet: Fleet, n: int) -> None:
+    fleet.pools["reassign_from"] = await fleet.scratch_devices(n, 1)
+    fleet.pools["reassign_to"] = await fleet.scratch_devices(n)
+
+
+async def rack_setup(fleet: Fleet, n: int) -> None:
+    fleet.pools["rack_from"] = await fleet.scratch_devices(n, 5)
+    fleet.pools["rack_to"] = await fleet.scratch_devices(n)
+
+
+def batch_ids(ids: list, i: int, size: int = 100) -> dict:
+    return {"ids": [pick(ids, i * size + k) for k in range(size)]}
+
+
+def bulk_body(fleet: Fleet, i: int) -> dict:
+    devices = fleet.pools["bulk"][i * 20:(i + 1) * 20]
+    return {
+        "items": [battery_body(fleet, device_id, i) for device_id, _ in devices for _ in range(5)],
+        "mode": "atomic",
+    }
+
+
+SCENARIOS: list[Scenario] = [
+    # app/routers/device.py
+    Scenario("GET /api/devices/", lambda f, i: ("GET", "/api/devices/?limit=100", None), query_budget=3),
+    Scenario(
+        "POST /api/devices/batch-get",
+        lambda f, i: ("POST", "/api/devices/batch-get", batch_ids(f.device_ids, i)),
+        query_budget=2,
+    ),
+    Scenario(
+        "GET /api/devices/?firmware_version&is_active",
+        lambda f, i: ("GET", f"/api/devices/?firmware_version={1 + i % 3}.{i % 10}.0&is_active=true&limit=100", None),
+        query_budget=3,
+    ),
+    Scenario("GET /api/devices/search?q=", lambda f, i: ("GET", f"/api/devices/search?q=d-{pick(f.device_ids, i) % 100000:05d}", None), query_budget=2),
+    Scenario("GET /api/devices/export", lambda f, i: ("GET", "/api/devices/export", None), max_requests=3, query_budget=1),
+    #Промах кэша: устройство с батареями (JOIN) и сверка ETag при RESPONSE_CACHE_VALIDATE
+    Scenario("GET /api/devices/{device_id}", lambda f, i: ("GET", f"/api/devices/{pick(f.device_ids, i)}", None), query_budget=2),
+    Scenario("GET /api/devices/{device_id}/batteries", lambda f, i: ("GET", f"/api/devices/{pick(f.device_ids, i)}/batteries", None), query_budget=1),
+    Scenario(
+        "POST /api/devices/",
+        lambda f, i: ("POST", "/api/devices/", {"name": f.unique_name("d"), "firmware_version": "1.0.0", "is_active": True}),
+        expected=(201,),
+        query_budget=2,
+    ),
+    Scenario(
+        "PUT /api/devices/{device_id}",
+        lambda f, i: ("PUT", f"/api/devices/{pick(f.pools['put_device'], i)[0]}", {"name": f.unique_name("d"), "firmware_version": f"2.{i}.0", "is_active": True}),
+        setup=pool_setup("put_device", cap=100),
+        query_budget=2,
+    ),
+    Scenario(
+        "PATCH /api/devices/{device_id}",
+        lambda f, i: ("PATCH", f"/api/devices/{pick(f.pools['patch_device'], i)[0]}", {"firmware_version": f"3.{i}.0"}),
+        setup=pool_setup("patch_device", cap=100),
+        query_budget=2,
+    ),
+    Scenario(
+        "DELETE /api/devices/{device_id}",
+        lambda f, i: ("DELETE", f"/api/devices/{f.pools['delete_device'][i][0]}", None),
+        setup=pool_setup("delete_device", batteries_each=1),
+        query_budget=2,
+    ),
+    Scenario(
+        "POST /api/devices/{device_id}/batteries",
+        lambda f, i: ("POST", f"/api/devices/{f.pools['add_battery'][i][0]}/batteries", battery_body(f, f.pools['add_battery'][i][0], i)),
+        setup=pool_setup("add_battery"),
+        expected=(201,),
+        query_budget=2,
+    ),
+    Scenario(
+        "DELETE /api/devices/{device_id}/batteries/{battery_id}",
+        lambda f, i: ("DELETE", "/api/devices/{0}/batteries/{1[0]}".format(*f.pools["remove_battery"][i]), None),
+        setup=pool_setup("remove_battery", batteries_each=1),
+        query_budget=2,
+    ),
+    # app/routers/battery.py
+    Scenario(
+        "POST /api/batteries/",
+        lambda f, i: ("POST", "/api/batteries/", battery_body(f, f.pools['create_battery'][i][0], i)),
+        setup=pool_setup("create_battery"),
+        expected=(201,),
+        query_budget=2,
+    ),
+    Scenario(
+        "POST /api/batteries/bulk",
+        lambda f, i: ("POST", "/api/batteries/bulk", bulk_body(f, i)),
+        setup=pool_setup("bulk", per_request=20),
+        expected=(201,),
+        max_requests=50,
+        query_budget=3,
+    ),
+    Scenario("GET /api/batteries/", lambda f, i: ("GET", "/api/batteries/?limit=100", None), query_budget=2),
+    Scenario(
+        "POST /api/batteries/batch-get",
+        lambda f, i: ("POST", "/api/batteries/batch-get", batch_ids(f.battery_ids, i)),
+        query_budget=1,
+    ),
+    Scenario(
+        "GET /api/batteries/?device_id",
+        lambda f, i: ("GET", f"/api/batteries/?device_id={pick(f.device_ids, i)}", None),
+        query_budget=2,
+    ),
+    Scenario(
+        "GET /api/batteries/?min_capacity&max_capacity&sort_by",
+        lambda f, i: ("GET", f"/api/batteries/?min_capacity={i % 90}&max_capacity={i % 90 + 5}&sort_by=residual_capacity&limit=100", None),
+        query_budget=2,
+    ),
+    Scenario("GET /api/batteries/search?q=", lambda f, i: ("GET", f"/api/batteries/search?q=b-{pick(f.battery_ids, i) % 100000:05d}", None), query_budget=1),
+    Scenario("GET /api/batteries/search?q= (prefix)", lambda f, i: ("GET", "/api/batteries/search?q=be", None), query_budget=1),
+    Scenario("GET /api/batteries/export", lambda f, i: ("GET", "/api/batteries/export", None), max_requests=3, query_budget=1),
+    #Промах кэша: батарея и ее устройство (selectinload) и сверка ETag при RESPONSE_CACHE_VALIDATE
+    Scenario("GET /api/batteries/{battery_id}", lambda f, i: ("GET", f"/api/batteries/{pick(f.battery_ids, i)}", None), query_budget=3),
+    Scenario(
+        "PUT /api/batteries/{battery_id}",
+        lambda f, i: (
+            "PUT",
+            f"/api/batteries/{pick(f.pools['put_battery'], i)[1][0]}",
+            battery_body(f, pick(f.pools['put_battery'], i)[0], i),
+        ),
+        setup=pool_setup("put_battery", batteries_each=1, cap=100),
+        query_budget=2,
+    ),
+    Scenario(
+        "PATCH /api/batteries/{battery_id}",
+        lambda f, i: ("PATCH", f"/api/batteries/{pick(f.pools['patch_battery'], i)[1][0]}", {"residual_capacity": float(i % 100)}),
+        setup=pool_setup("patch_battery", batteries_each=1, cap=100),
+        query_budget=2,
+    ),
+    Scenario(
+        "DELETE /api/batteries/{battery_id}",
+        lambda f, i: ("DELETE", f"/api/batteries/{f.pools['delete_battery'][i][1][0]}", None),
+        setup=pool_setup("delete_battery", batteries_each=1),
+        query_budget=2,
+    ),
+    Scenario(
+        "POST /api/batteries/{battery_id}/ressign/{device_id}",
+        lambda f, i: ("POST", f"/api/batteries/{f.pools['reassign_from'][i][1][0]}/ressign/{f.pools['reassign_to'][i][0]}", None),
+        setup=reassign_setup,
+        query_budget=2,
+    ),
+    Scenario(
+        "POST /api/batteries/reassign",
+        lambda f, i: ("POST", "/api/batteries/reassign", {"from_device_id": f.pools["rack_from"][i][0], "to_device_id": f.pools["rack_to"][i][0]}),
+        setup=rack_setup,
+        query_budget=3,
+    ),
+    Scenario("GET /api/batteries/stats/summary", lambda f, i: ("GET", "/api/batteries/stats/summary", None), query_budget=1),
+    #Id из памяти и, если они отстали от базы, запрос алерта
+    Scenario("GET /api/batteries/alerts/low_capacity", lambda f, i: ("GET", "/api/batteries/alerts/low_capacity", None), max_requests=50, query_budget=2),
+    Scenario("GET /api/batteries/alerts/need_replacment", lambda f, i: ("GET", "/api/batteries/alerts/need_replacment", None), max_requests=50, query_budget=2),
+]
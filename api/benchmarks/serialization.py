@@ -0,0 +1,123 @@
+"""
+Стоимость сериализации страницы ответа на один элемент, без базы и HTTP.
+Страницы собираются из словарей в форме строк READ_COLUMNS, как их отдает слой чтения.
+
+    python -m benchmarks.serialization --items 1000 --repeat 50
+
+Для страниц батарей и устройств (по 5 батарей) сравниваются:
+response_model - схема ответа в обработчике и повторная проверка и сериализация
+FastAPI по response_model (как работают маршруты по умолчанию);
+model_dump_json - только схема ответа и ее model_dump_json;
+fast_json - FAST_JSON_RESPONSES: словари по полям схемы и pydantic-core to_json.
+Заодно проверяется, что все способы дают одинаковый JSON
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from app.main import app
+from app.schemas.battery import BatteryList
+from app.schemas.device import DeviceList
+from app.services.fast_json import dump_json
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.serialization", description="Бенчмарк сериализации страниц")
+    parser.add_argument("--items", type=int, default=1000, help="Элементов на странице")
+    parser.add_argument("--repeat", type=int, default=50, help="Повторов каждого способа")
+    parser.add_argument("--output", default=None, help="Куда сохранить результаты (JSON)")
+    return parser.parse_args(argv)
+
+
+def make_batteries(n: int, device_id: int = 1, start: int = 1) -> list[dict]:
+    return [
+        dict(
+            id=i, name=f"bench-b-{i:08d}", nominal_voltage=12.0, residual_capacity=float(i % 100),
+            service_life=30 + i % 3000, device_id=device_id,
+        )
+        for i in range(start, start + n)
+    ]
+
+
+def make_devices(n: int) -> list[dict]:
+    return [
+        dict(id=i, name=f"bench-d-{i:08d}", firmware_version="1.0.0", is_active=True, batteries=make_batteries(5, i, i * 5))
+        for i in range(1, n + 1)
+    ]
+
+
+def route_field(path: str):
+    for route in app.routes:
+        if isinstance(route, APIRoute) and route.path == path and "GET" in route.methods:
+            return route.response_field
+    raise LookupError(path)
+
+
+def measure(fn, repeat: int) -> list[float]:
+    fn()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main(args: argparse.Namespace) -> int:
+    cases = {
+        "batteries": (BatteryList, make_batteries(args.items), "/api/batteries/"),
+        "devices": (DeviceList, make_devices(args.items), "/api/devices/"),
+    }
+    loop = asyncio.new_event_loop()
+    report = {"items": args.items, "repeat": args.repeat, "results": {}}
+    problems = []
+    for name, (model, rows, path) in cases.items():
+        page = dict(devices=rows, total=len(rows), skip=0, limit=len(rows), next_cursor=None)
+        field = route_field(path)
+
+        def response_model():
+            content = loop.run_until_complete(serialize_response(field=field, response_content=model(**page)))
+            return JSONResponse(content).body
+
+        methods = {
+            "response_model": response_model,
+            "model_dump_json": lambda: model(**page).model_dump_json().encode(),
+            "fast_json": lambda: dump_json(model, page),
+        }
+        outputs = {method: json.loads(fn()) for method, fn in methods.items()}
+        if any(output != outputs["response_model"] for output in outputs.values()):
+            problems.append(f"{name}: outputs differ")
+
+        results = {}
+        for method, fn in methods.items():
+            median = statistics.median(measure(fn, args.repeat))
+            results[method] = {
+                "page_ms": round(median * 1000, 3),
+                "per_item_us": round(median / args.items * 1e6, 3),
+            }
+        base = results["response_model"]["page_ms"]
+        for result in results.values():
+            result["speedup"] = round(base / result["page_ms"], 2) if result["page_ms"] else None
+        report["results"][name] = results
+    loop.close()
+
+    print(f"{'page':10} {'method':16} {'page ms':>10} {'us/item':>10} {'speedup':>8}")
+    for name, results in report["results"].items():
+        for method, result in results.items():
+            print(f"{name:10} {method:16} {result['page_ms']:>10} {result['per_item_us']:>10} {result['speedup']:>8}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    for problem in problems:
+        print(f"FAIL {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,129 @@
+"""
+Холодный старт: время импорта приложения, время до /health/live и /health/ready
+и цена первого запроса после старта по сравнению с последующими.
+
+    python -m benchmarks.startup --imports 5 --requests 20
+
+Импорт меряется в свежих процессах (медиана), с разбивкой по модулям app.* из -X importtime.
+Сервер (python -m app.server, один воркер) запускается дважды: без прогрева пула
+(DB_POOL_WARMUP=0) и с прогревом по настройкам. База - из .env
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.scaling import stop_server
+
+MODES = {
+    "no_warmup": {"DB_POOL_WARMUP": "0", "DB_PREPARE_STATEMENTS": "false"},
+    "warmup": {},
+}
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import app.main; print(time.perf_counter() - started)"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description="Бенчмарк холодного старта")
+    parser.add_argument("--imports", type=int, default=5, help="Запусков для замера импорта")
+    parser.add_argument("--requests", type=int, default=20, help="Запросов после первого для сравнения")
+    parser.add_argument("--path", default="/api/devices/?limit=100", help="Маршрут первого запроса")
+    parser.add_argument("--port", type=int, default=8100, help="Порт запускаемого сервера")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Сколько ждать готовности, с")
+    parser.add_argument("--output", default=None, help="Куда сохранить результаты (JSON)")
+    return parser.parse_args(argv)
+
+
+def measure_import(runs: int) -> dict:
+    timings = [
+        float(subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET], text=True, stderr=subprocess.DEVNULL))
+        for _ in range(runs)
+    ]
+    trace = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], capture_output=True, text=True).stderr
+    modules = []
+    for line in trace.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, cumulative, name = (part.strip() for part in line.removeprefix("import time:").split("|"))
+        if own.isdigit() and name.startswith("app."):
+            modules.append({"module": name, "own_ms": int(own) / 1000, "cumulative_ms": int(cumulative) / 1000})
+    modules.sort(key=lambda m: m["own_ms"], reverse=True)
+    return {"median_ms": round(statistics.median(timings) * 1000, 1), "runs_ms": [round(t * 1000, 1) for t in timings], "modules": modules[:10]}
+
+
+def wait_for(url: str, process: subprocess.Popen, deadline: float) -> float | None:
+    """Момент (time.monotonic) первого ответа 200 по url или None, если не дождались"""
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.monotonic()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.02)
+    return None
+
+
+def measure_server(mode: dict, args: argparse.Namespace) -> dict:
+    env = {**os.environ, **mode, "SERVER_WORKERS": "1", "SERVER_PORT": str(args.port), "SERVER_HOST": "127.0.0.1"}
+    base = f"http://127.0.0.1:{args.port}"
+    started = time.monotonic()
+    process = subprocess.Popen([sys.executable, "-m", "app.server"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = started + args.timeout
+        live = wait_for(f"{base}/health/live", process, deadline)
+        ready = wait_for(f"{base}/health/ready", process, deadline) if live else None
+        result = {
+            "live_ms": round((live - started) * 1000, 1) if live else None,
+            "ready_ms": round((ready - started) * 1000, 1) if ready else None,
+        }
+        if ready is None:
+            return result
+        with httpx.Client(base_url=base, timeout=60) as client:
+            warmup = client.get("/health/ready").json()["warmup"]
+            timings = []
+            for _ in range(args.requests + 1):
+                request_started = time.perf_counter()
+                client.get(args.path).raise_for_status()
+                timings.append(time.perf_counter() - request_started)
+        rest = statistics.median(timings[1:]) if len(timings) > 1 else timings[0]
+        result.update({
+            "warmup": warmup,
+            "first_request_ms": round(timings[0] * 1000, 2),
+            "next_requests_p50_ms": round(rest * 1000, 2),
+            "first_request_penalty_ms": round((timings[0] - rest) * 1000, 2),
+        })
+        return result
+    finally:
+        stop_server(process)
+
+
+def main(args: argparse.Namespace) -> int:
+    report = {"import": measure_import(args.imports), "server": {}}
+    for name, mode in MODES.items():
+        report["server"][name] = measure_server(mode, args)
+
+    imports = report["import"]
+    print(f"import app.main: {imports['median_ms']} ms (median of {args.imports})")
+    for module in imports["modules"]:
+        print(f"  {module['module']:40} own {module['own_ms']:>8} ms  cumulative {module['cumulative_ms']:>8} ms")
+    print(f"{'mode':12} {'live ms':>9} {'ready ms':>9} {'first ms':>9} {'next p50':>9} {'penalty':>9}")
+    for name, result in report["server"].items():
+        print(
+            f"{name:12} {str(result['live_ms']):>9} {str(result['ready_ms']):>9} {str(result.get('first_request_ms')):>9} "
+            f"{str(result.get('next_requests_p50_ms')):>9} {str(result.get('first_request_penalty_ms')):>9}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0 if all(result["ready_ms"] is not None for result in report["server"].values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
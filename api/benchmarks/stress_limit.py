@@ -0,0 +1,107 @@
+"""
+Стресс-тест лимита в 5 батарей на устройство.
+
+    python -m benchmarks.stress_limit --attaches 500 --concurrency 200
+
+Сотни параллельных POST /api/devices/{id}/batteries к одному устройству
+должны создать ровно 5 батарей. Вставки к другим устройствам замеряются
+отдельно и на фоне этой нагрузки: блокировка строки одного устройства
+не должна заметно снижать их пропускную способность
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from contextlib import AsyncExitStack
+
+from sqlalchemy import func, select
+
+from app.database import async_session_maker, dispose_engine, init_engine
+from app.models.battery import Battery
+from app.models.device import Device
+from benchmarks.fleet import Fleet, cleanup_scratch
+from benchmarks.runner import open_client, run_scenario
+from benchmarks.scenarios import Scenario, battery_body
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.stress_limit", description="Стресс-тест лимита батарей")
+    parser.add_argument("--attaches", type=int, default=500, help="Параллельных вставок к одному устройству")
+    parser.add_argument("--concurrency", type=int, default=200, help="Одновременных вставок к этому устройству")
+    parser.add_argument("--others", type=int, default=500, help="Вставок к другим устройствам в каждой фазе")
+    parser.add_argument("--others-concurrency", type=int, default=16)
+    parser.add_argument("--max-slowdown", type=float, default=30.0, help="Допустимое падение пропускной способности других устройств, проценты")
+    parser.add_argument("--url", default=None, help="Адрес запущенного сервера (по умолчанию приложение в процессе)")
+    parser.add_argument("--output", default=None, help="Куда сохранить результаты (JSON)")
+    return parser.parse_args(argv)
+
+
+def attach_scenario(name: str, pool: str, expected: tuple[int, ...]) -> Scenario:
+    """Вставка батареи к i-му устройству пула (пул из одного устройства - все к нему)"""
+    def build(fleet: Fleet, i: int):
+        devices = fleet.pools[pool]
+        device_id = devices[i % len(devices)][0]
+        return "POST", f"/api/devices/{device_id}/batteries", battery_body(fleet, device_id, i)
+    return Scenario(name, build, expected=expected)
+
+
+async def main(args: argparse.Namespace) -> int:
+    init_engine()
+    fleet = Fleet(async_session_maker, [], [], run_id=uuid.uuid4().hex[:8])
+    fleet.pools["hot"] = await fleet.scratch_devices(1)
+    fleet.pools["baseline"] = await fleet.scratch_devices(args.others)
+    fleet.pools["contended"] = await fleet.scratch_devices(args.others)
+    hot_id = fleet.pools["hot"][0][0]
+
+    hot = attach_scenario("hot device", "hot", expected=(201, 400))
+    baseline = attach_scenario("other devices, alone", "baseline", expected=(201,))
+    contended = attach_scenario("other devices, with hot device", "contended", expected=(201,))
+
+    async with AsyncExitStack() as stack:
+        client = await open_client(stack, args.url)
+        try:
+            results = {baseline.name: await run_scenario(client, fleet, baseline, args.others, args.others_concurrency)}
+            hot_result, contended_result = await asyncio.gather(
+                run_scenario(client, fleet, hot, args.attaches, args.concurrency),
+                run_scenario(client, fleet, contended, args.others, args.others_concurrency),
+            )
+            results[hot.name] = hot_result
+            results[contended.name] = contended_result
+
+            async with async_session_maker() as session:
+                stored = await session.scalar(select(Device.battery_count).where(Device.id == hot_id))
+                actual = await session.scalar(select(func.count(Battery.id)).where(Battery.device_id == hot_id))
+        finally:
+            await cleanup_scratch(async_session_maker)
+    await dispose_engine()
+
+    created = hot_result["statuses"].get("201", 0)
+    alone_rps = results[baseline.name]["throughput_rps"]
+    contended_rps = contended_result["throughput_rps"]
+    slowdown = round((1 - contended_rps / alone_rps) * 100, 1) if alone_rps else 0.0
+    report = {
+        "hot_device": {"created": created, "battery_count": stored, "batteries": actual, "statuses": hot_result["statuses"]},
+        "other_devices": {"alone_rps": alone_rps, "contended_rps": contended_rps, "slowdown_pct": slowdown},
+        "results": results,
+    }
+    print(json.dumps(report["hot_device"], ensure_ascii=False))
+    print(json.dumps(report["other_devices"], ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    problems = []
+    if not created == stored == actual == 5:
+        problems.append(f"hot device has {actual} batteries (counter {stored}, created {created}), expected 5")
+    if hot_result["errors"] or contended_result["errors"] or results[baseline.name]["errors"]:
+        problems.append("unexpected response statuses")
+    if slowdown > args.max_slowdown:
+        problems.append(f"other devices slowed down by {slowdown}%")
+    for problem in problems:
+        print(f"FAIL {problem}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
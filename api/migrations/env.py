@@ -12,7 +12,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.config import settings
 print(settings.DB_NAME)
-from app.models import battery, device
+from app.models import battery, device, reading
 from app.database import Base
 
 
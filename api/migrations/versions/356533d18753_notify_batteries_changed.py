@@ -0,0 +1,43 @@
+"""Notify batteries_changed channel after every statement that changes batteries
+
+Revision ID: 356533d18753
+Revises: 4bd783dc205c
+Create Date: 2026-10-18 11:20:37.402915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '356533d18753'
+down_revision: Union[str, Sequence[str], None] = '4bd783dc205c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Одинаковые уведомления одной транзакции Postgres склеивает: на транзакцию приходит одно,
+    # после COMMIT - по нему воркеры сбрасывают кэш статистики по батареям
+    op.execute("""
+        CREATE OR REPLACE FUNCTION batteries_changed_notify() RETURNS TRIGGER AS $$
+        BEGIN
+            PERFORM pg_notify('batteries_changed', '');
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER batteries_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON batteries
+        FOR EACH STATEMENT EXECUTE FUNCTION batteries_changed_notify()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS batteries_changed ON batteries")
+    op.execute("DROP FUNCTION IF EXISTS batteries_changed_notify()")
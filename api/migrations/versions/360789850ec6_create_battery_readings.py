@@ -0,0 +1,54 @@
+"""Create battery_readings partitioned table
+
+Revision ID: 360789850ec6
+Revises: 48ad177cbf75
+Create Date: 2026-10-17 10:12:41.208316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '360789850ec6'
+down_revision: Union[str, Sequence[str], None] = '48ad177cbf75'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        CREATE TABLE battery_readings (
+            battery_id INTEGER NOT NULL REFERENCES batteries (id) ON DELETE CASCADE,
+            recorded_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            voltage DOUBLE PRECISION NOT NULL,
+            capacity DOUBLE PRECISION NOT NULL
+        ) PARTITION BY RANGE (recorded_at)
+    """)
+    op.create_index('ix_battery_readings_battery_id_recorded_at', 'battery_readings', ['battery_id', 'recorded_at'], unique=False)
+    # Секция на сутки (UTC) создается по требованию перед записью показаний за этот день
+    op.execute("""
+        CREATE OR REPLACE FUNCTION ensure_battery_readings_partition(day DATE) RETURNS VOID AS $$
+        BEGIN
+            EXECUTE format(
+                'CREATE TABLE IF NOT EXISTS %I PARTITION OF battery_readings FOR VALUES FROM (%L) TO (%L)',
+                'battery_readings_' || to_char(day, 'YYYYMMDD'),
+                day::timestamp AT TIME ZONE 'UTC',
+                (day + 1)::timestamp AT TIME ZONE 'UTC'
+            );
+        EXCEPTION WHEN duplicate_table OR unique_violation THEN
+            -- секцию параллельно создал другой воркер
+            NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP FUNCTION IF EXISTS ensure_battery_readings_partition(DATE)")
+    op.drop_index('ix_battery_readings_battery_id_recorded_at', table_name='battery_readings')
+    op.drop_table('battery_readings')
@@ -0,0 +1,98 @@
+"""Notify battery_alerts channel when a battery crosses alert thresholds
+
+Revision ID: 4bd783dc205c
+Revises: 80cbc77b39ac
+Create Date: 2026-10-17 16:02:44.118205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4bd783dc205c'
+down_revision: Union[str, Sequence[str], None] = '80cbc77b39ac'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Пороги совпадают с LOW_CAPACITY_THRESHOLD и REPLACEMENT_* в app/crud/battery.py
+LOW_CAPACITY = "{r}.residual_capacity < 20"
+NEED_REPLACEMENT = "({r}.residual_capacity < 10 OR {r}.service_life < 30)"
+
+
+def _notify(rows: str, was_low: str, was_replacement: str, now_low: str, now_replacement: str, join: str = "") -> str:
+    """PERFORM pg_notify для строк, у которых поменялось членство хотя бы в одном алерте"""
+    return f"""
+                PERFORM pg_notify('battery_alerts', json_build_object(
+                    'battery_id', r.id,
+                    'device_id', r.device_id,
+                    'alert', a.alert,
+                    'active', a.now_in,
+                    'residual_capacity', r.residual_capacity,
+                    'service_life', r.service_life
+                )::text)
+                FROM {rows} r {join}
+                CROSS JOIN LATERAL (VALUES
+                    ('low_capacity', {was_low}, {now_low}),
+                    ('need_replacement', {was_replacement}, {now_replacement})
+                ) AS a(alert, was_in, now_in)
+                WHERE a.was_in IS DISTINCT FROM a.now_in;"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Уведомление отправляется только при пересечении порога, а не на каждую запись:
+    # массовая загрузка показаний без смены состояния не создает событий.
+    # pg_notify доставляется подписчикам после COMMIT, откат транзакции событий не шлет
+    insert = _notify(
+        "new_rows", "false", "false",
+        LOW_CAPACITY.format(r="r"), NEED_REPLACEMENT.format(r="r"),
+    )
+    delete = _notify(
+        "old_rows", LOW_CAPACITY.format(r="r"), NEED_REPLACEMENT.format(r="r"),
+        "false", "false",
+    )
+    update = _notify(
+        "new_rows", LOW_CAPACITY.format(r="o"), NEED_REPLACEMENT.format(r="o"),
+        LOW_CAPACITY.format(r="r"), NEED_REPLACEMENT.format(r="r"),
+        join="JOIN old_rows o ON o.id = r.id",
+    )
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION battery_alert_notify() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN{insert}
+            ELSIF TG_OP = 'DELETE' THEN{delete}
+            ELSE{update}
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER batteries_alert_insert
+        AFTER INSERT ON batteries
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION battery_alert_notify()
+    """)
+    op.execute("""
+        CREATE TRIGGER batteries_alert_update
+        AFTER UPDATE ON batteries
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION battery_alert_notify()
+    """)
+    op.execute("""
+        CREATE TRIGGER batteries_alert_delete
+        AFTER DELETE ON batteries
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION battery_alert_notify()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for action in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS batteries_alert_{action} ON batteries")
+    op.execute("DROP FUNCTION IF EXISTS battery_alert_notify()")
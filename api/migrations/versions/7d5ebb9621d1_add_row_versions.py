@@ -0,0 +1,54 @@
+"""Add row version columns to devices and batteries
+
+Revision ID: 7d5ebb9621d1
+Revises: 360789850ec6
+Create Date: 2026-10-17 11:02:57.614093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d5ebb9621d1'
+down_revision: Union[str, Sequence[str], None] = '360789850ec6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Одна последовательность на обе таблицы: версии уникальны и только растут
+    op.execute("CREATE SEQUENCE row_version_seq")
+    for table in ("devices", "batteries"):
+        op.add_column(table, sa.Column('version', sa.BigInteger(), server_default=sa.text("nextval('row_version_seq')"), nullable=False))
+        op.create_index(op.f(f'ix_{table}_version'), table, ['version'], unique=False)
+
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_row_version() RETURNS TRIGGER AS $$
+        BEGIN
+            NEW.version := nextval('row_version_seq');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    for table in ("devices", "batteries"):
+        op.execute(f"""
+            CREATE TRIGGER {table}_bump_version
+            BEFORE UPDATE ON {table}
+            FOR EACH ROW
+            WHEN (OLD.* IS DISTINCT FROM NEW.*)
+            EXECUTE FUNCTION bump_row_version()
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in ("devices", "batteries"):
+        op.execute(f"DROP TRIGGER IF EXISTS {table}_bump_version ON {table}")
+        op.drop_index(op.f(f'ix_{table}_version'), table_name=table)
+        op.drop_column(table, 'version')
+    op.execute("DROP FUNCTION IF EXISTS bump_row_version()")
+    op.execute("DROP SEQUENCE IF EXISTS row_version_seq")
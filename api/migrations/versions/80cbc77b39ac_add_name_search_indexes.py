@@ -0,0 +1,47 @@
+"""Add pg_trgm and prefix indexes for name search
+
+Revision ID: 80cbc77b39ac
+Revises: df53ec6f0ee7
+Create Date: 2026-10-17 13:41:27.550912
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '80cbc77b39ac'
+down_revision: Union[str, Sequence[str], None] = 'df53ec6f0ee7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('devices', 'batteries')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            # Подстрока (ILIKE '%q%') и опечатки (name % q)
+            op.create_index(
+                f'ix_{table}_name_trgm', table, ['name'],
+                postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'},
+                postgresql_concurrently=True, if_not_exists=True
+            )
+            # Префикс для коротких запросов: LIKE 'q%' и сортировка по тому же выражению
+            op.create_index(
+                f'ix_{table}_name_lower_prefix', table, [sa.text('lower(name) COLLATE "C"')],
+                postgresql_concurrently=True, if_not_exists=True
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.drop_index(f'ix_{table}_name_lower_prefix', table_name=table, postgresql_concurrently=True, if_exists=True)
+            op.drop_index(f'ix_{table}_name_trgm', table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,106 @@
+"""Add devices.battery_count maintained by triggers
+
+Revision ID: b5f0f29e5355
+Revises: 7d5ebb9621d1
+Create Date: 2026-10-17 12:21:09.403518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5f0f29e5355'
+down_revision: Union[str, Sequence[str], None] = '7d5ebb9621d1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('devices', sa.Column('battery_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE devices d SET battery_count = c.n
+        FROM (SELECT device_id, count(*) AS n FROM batteries WHERE device_id IS NOT NULL GROUP BY device_id) c
+        WHERE d.id = c.device_id
+    """)
+    op.create_check_constraint('ck_devices_battery_count', 'devices', 'battery_count BETWEEN 0 AND 5')
+
+    # Счетчик меняется одним UPDATE на оператор (transition tables), а не на каждую строку.
+    # UPDATE строки устройства держит ее блокировку до конца транзакции, поэтому
+    # параллельные вставки к одному устройству выстраиваются в очередь, а к разным - нет.
+    # Устройства блокируются в порядке id, чтобы пачки по нескольким устройствам не ловили deadlock
+    op.execute("""
+        CREATE OR REPLACE FUNCTION battery_count_sync() RETURNS TRIGGER AS $$
+        DECLARE
+            ids INTEGER[];
+            deltas INTEGER[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(device_id ORDER BY device_id), array_agg(n ORDER BY device_id) INTO ids, deltas
+                FROM (
+                    SELECT device_id, count(*)::INTEGER AS n FROM new_rows
+                    WHERE device_id IS NOT NULL GROUP BY device_id
+                ) c;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(device_id ORDER BY device_id), array_agg(n ORDER BY device_id) INTO ids, deltas
+                FROM (
+                    SELECT device_id, -count(*)::INTEGER AS n FROM old_rows
+                    WHERE device_id IS NOT NULL GROUP BY device_id
+                ) c;
+            ELSE
+                SELECT array_agg(device_id ORDER BY device_id), array_agg(n ORDER BY device_id) INTO ids, deltas
+                FROM (
+                    SELECT device_id, sum(d)::INTEGER AS n
+                    FROM (
+                        SELECT n.device_id, 1 AS d FROM new_rows n JOIN old_rows o ON o.id = n.id
+                        WHERE n.device_id IS DISTINCT FROM o.device_id
+                        UNION ALL
+                        SELECT o.device_id, -1 AS d FROM new_rows n JOIN old_rows o ON o.id = n.id
+                        WHERE n.device_id IS DISTINCT FROM o.device_id
+                    ) moved
+                    WHERE device_id IS NOT NULL
+                    GROUP BY device_id
+                    HAVING sum(d) <> 0
+                ) c;
+            END IF;
+
+            IF ids IS NOT NULL THEN
+                PERFORM 1 FROM devices WHERE id = ANY(ids) ORDER BY id FOR UPDATE;
+                UPDATE devices d SET battery_count = d.battery_count + c.delta
+                FROM unnest(ids, deltas) AS c(device_id, delta)
+                WHERE d.id = c.device_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER batteries_count_insert
+        AFTER INSERT ON batteries
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION battery_count_sync()
+    """)
+    op.execute("""
+        CREATE TRIGGER batteries_count_update
+        AFTER UPDATE ON batteries
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION battery_count_sync()
+    """)
+    op.execute("""
+        CREATE TRIGGER batteries_count_delete
+        AFTER DELETE ON batteries
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION battery_count_sync()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for action in ("insert", "update", "delete"):
+        op.execute(f"DROP TRIGGER IF EXISTS batteries_count_{action} ON batteries")
+    op.execute("DROP FUNCTION IF EXISTS battery_count_sync()")
+    op.drop_constraint('ck_devices_battery_count', 'devices', type_='check')
+    op.drop_column('devices', 'battery_count')
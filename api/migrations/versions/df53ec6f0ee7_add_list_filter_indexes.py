@@ -0,0 +1,44 @@
+"""Add indexes for list filters and sorting
+
+Revision ID: df53ec6f0ee7
+Revises: b5f0f29e5355
+Create Date: 2026-10-17 13:05:44.118207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'df53ec6f0ee7'
+down_revision: Union[str, Sequence[str], None] = 'b5f0f29e5355'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (имя, таблица, колонки). Составные индексы (колонка, id) обслуживают и фильтр
+# по диапазону, и keyset-пагинацию с сортировкой по этой колонке
+INDEXES = (
+    ('ix_batteries_device_id', 'batteries', ['device_id']),
+    ('ix_batteries_residual_capacity_id', 'batteries', ['residual_capacity', 'id']),
+    ('ix_batteries_service_life_id', 'batteries', ['service_life', 'id']),
+    ('ix_batteries_nominal_voltage_id', 'batteries', ['nominal_voltage', 'id']),
+    ('ix_devices_firmware_version_id', 'devices', ['firmware_version', 'id']),
+    ('ix_devices_battery_count_id', 'devices', ['battery_count', 'id']),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
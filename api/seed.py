@@ -1,5 +1,5 @@
 import asyncio
-from app.database import async_session_maker
+from app.database import async_session_maker, dispose_engine, init_engine
 from app.crud.device import DeviceCRUD
 from app.crud.battery import BatteryCRUD
 from app.schemas.device import DeviceCreate
@@ -7,6 +7,7 @@ from app.schemas.battery import BatteryCreate
 
 
 async def seed_data():
+    init_engine()
     async with async_session_maker() as session:
         device_crud = DeviceCRUD(session)
         battery_crud = BatteryCRUD(session)
@@ -48,6 +49,7 @@ async def seed_data():
                 print(f"Батарея '{b.name}' уже существует, пропускаем.")
 
         print("\nБаза данных успешно заполнена тестовыми данными!")
+    await dispose_engine()
 
 
 if __name__ == "__main__":
@@ -8,20 +8,39 @@ export default function StatsPage() {
   const [summary, setSummary] = useState({});
 
   useEffect(() => {
-    fetch("http://127.0.0.1:8000/api/batteries/alerts/need_replacment")
-      .then(res => res.json())
-      .then(setNeedReplacement)
-      .catch(err => console.error(err));
+    const load = () => {
+      fetch("http://127.0.0.1:8000/api/batteries/alerts/need_replacment")
+        .then(res => res.json())
+        .then(setNeedReplacement)
+        .catch(err => console.error(err));
 
-    fetch("http://127.0.0.1:8000/api/batteries/alerts/low_capacity")
-      .then(res => res.json())
-      .then(setLowCapacity)
-      .catch(err => console.error(err));
+      fetch("http://127.0.0.1:8000/api/batteries/alerts/low_capacity")
+        .then(res => res.json())
+        .then(setLowCapacity)
+        .catch(err => console.error(err));
 
-    fetch("http://127.0.0.1:8000/api/batteries/stats/summary")
-      .then(res => res.json())
-      .then(setSummary)
-      .catch(err => console.error(err));
+      fetch("http://127.0.0.1:8000/api/batteries/stats/summary")
+        .then(res => res.json())
+        .then(setSummary)
+        .catch(err => console.error(err));
+    };
+    load();
+
+    // Перечитываем данные только когда батарея пересекла порог, а не по таймеру.
+    // События пачкой (массовая загрузка) схлопываются в одно обновление
+    let timer = null;
+    const reload = () => {
+      clearTimeout(timer);
+      timer = setTimeout(load, 500);
+    };
+    const stream = new EventSource("http://127.0.0.1:8000/api/batteries/alerts/stream");
+    stream.addEventListener("alert", reload);
+    stream.addEventListener("resync", reload);
+
+    return () => {
+      clearTimeout(timer);
+      stream.close();
+    };
   }, []);
 
   const cardStyle = {